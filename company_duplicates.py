@@ -1,31 +1,73 @@
 # file: company_duplicates.py
 import os
 import re
+import sys
 import csv
+import json
 import time
 import argparse
+import multiprocessing
+import numpy as np
+import orjson
 import requests
-from collections import defaultdict, Counter
-from datetime import datetime
+from array import array
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from operator import itemgetter
 from dotenv import load_dotenv
+from rapidfuzz import fuzz, process
+from requests.adapters import HTTPAdapter
+
+from dedup_utils import TokenBucket, UnionFind
 
 # --- HubSpot API endpoints ---
 BASE = "https://api.hubapi.com"
 COMPANY_LIST = "/crm/v3/objects/companies"
+COMPANY_SEARCH = "/crm/v3/objects/companies/search"
 ASSOC_BATCH_READ = "/crm/v3/associations/companies/contacts/batch/read"
 CONTACT_BATCH_READ = "/crm/v3/objects/contacts/batch/read"
 
 PAGE_LIMIT = 100
 BATCH_SIZE = 100
 MAX_RETRIES = 5
+MAX_WORKERS = 8  # parallel batch-read POSTs
+POOL_SIZE = 16   # keep-alive connections per host
+RATE_LIMIT = 9   # requests per second until HubSpot's X-HubSpot-RateLimit-* headers say otherwise
+SEARCH_MAX_RESULTS = 10_000  # HubSpot search does not page past this many results
+
+COMPANY_PROPERTIES = ["name", "domain", "business_id", "hs_lastmodifieddate"]
+CACHE_PATH = os.path.join("data", "companies_cache.json")
+CACHE_OVERLAP = 300  # seconds the --cache watermark is set before the scan start (clock skew, search index lag)
+
+# Distinct names before norm_names uses a process pool (only with 2+ CPUs). Measured: norm_name
+# ~2.5 us/name, shipping a name to a worker and back ~0.8 us, so a pool never wins on one core;
+# on two it should break even around 20k names, and 50k leaves room for pool startup.
+NORM_POOL_MIN = 50_000
+FUZZY_NAME_THRESHOLD = 88  # default token_set_ratio cutoff for --fuzzy-name
+FUZZY_BLOCK_MAX = 2000     # larger comparison windows (a block plus the next longer one) are skipped
 
 # Common freemail domains to ignore when deriving org domains from contacts
-FREEMAIL = {
+FREEMAIL = frozenset(map(sys.intern, (
     "gmail.com", "outlook.com", "hotmail.com", "live.com", "yahoo.com", "icloud.com",
     "me.com", "msn.com", "aol.com", "proton.me", "protonmail.com", "mail.com", "gmx.com"
-}
+)))
+
+# norm_name patterns, compiled once
+_RE_WS = re.compile(r"[\s\-_]+")
+_RE_PUNCT = re.compile(r"[^\w\s]")
+_RE_SUFFIX = re.compile(r"\b(?:oy|ab|ltd|inc|oyj)\b\.?")
+
+# One fetched company; norm_name is computed once at fetch time.
+Company = namedtuple("Company", "id name domain business_id norm_name")
+
+# Company -> contact associations in compressed-sparse-row form: the contacts of
+# company_ids[i] are contact_ids[offsets[i]:offsets[i + 1]] (int64 arrays).
+Associations = namedtuple("Associations", "company_ids offsets contact_ids")
 
 # ---------- helpers ----------
+RATE_LIMITER = TokenBucket(RATE_LIMIT)
+
 def load_token() -> str:
     load_dotenv()
     t = os.getenv("HUBSPOT_TOKEN")
@@ -35,6 +77,7 @@ def load_token() -> str:
 
 def session_with_headers(token: str) -> requests.Session:
     s = requests.Session()
+    s.mount("https://", HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE))
     s.headers.update({
         "Authorization": f"Bearer {token}",
         "Accept-Encoding": "gzip, deflate",
@@ -45,11 +88,13 @@ def session_with_headers(token: str) -> requests.Session:
 def request_with_retry(s: requests.Session, method: str, url: str, **kwargs) -> requests.Response:
     """
     HTTP request with retries for rate limiting / transient server errors.
-    Respects Retry-After when present.
+    Requests are paced by RATE_LIMITER; Retry-After is respected when present.
     """
     last = None
     for attempt in range(1, MAX_RETRIES + 1):
+        RATE_LIMITER.acquire()
         r = s.request(method, url, timeout=30, **kwargs)
+        RATE_LIMITER.update(r.headers)
         if r.status_code not in (429, 500, 502, 503, 504):
             return r
         ra = r.headers.get("Retry-After")
@@ -57,10 +102,24 @@ def request_with_retry(s: requests.Session, method: str, url: str, **kwargs) ->
             sleep_for = float(ra) if ra else min(10.0, attempt * 1.5)
         except ValueError:
             sleep_for = min(10.0, attempt * 1.5)
+        if r.status_code == 429:
+            # hold back the other workers as well, not just this one
+            RATE_LIMITER.pause(sleep_for)
         time.sleep(sleep_for)
         last = r
     return last or r
 
+def run_batches(fn, ids: list) -> list:
+    """
+    Call fn once per BATCH_SIZE slice of ids and return the results in slice order.
+    Slices are processed in a thread pool when there is more than one.
+    """
+    batches = [ids[i:i + BATCH_SIZE] for i in range(0, len(ids), BATCH_SIZE)]
+    if len(batches) <= 1:
+        return [fn(b) for b in batches]
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(batches))) as ex:
+        return list(ex.map(fn, batches))
+
 def norm_domain(v: str | None) -> str:
     if not v:
         return ""
@@ -73,27 +132,62 @@ def norm_name(v: str | None) -> str:
     if not v:
         return ""
     n = v.casefold().strip()
-    n = re.sub(r"[\s\-_]+", " ", n)
-    n = re.sub(r"[^\w\s]", "", n, flags=re.UNICODE)
+    n = _RE_WS.sub(" ", n)
+    n = _RE_PUNCT.sub("", n)
     # conservatively remove some common suffixes
-    n = re.sub(r"\b(oy|ab|ltd|inc|oyj)\b\.?", "", n).strip()
-    return n
+    return _RE_SUFFIX.sub("", n).strip()
 
 def email_to_domain(email: str | None) -> str:
     if not email or "@" not in email:
         return ""
-    return norm_domain(email.split("@", 1)[1])
+    # interned: contacts cluster on few domains, which are compared and counted repeatedly
+    return sys.intern(norm_domain(email.split("@", 1)[1]))
+
+def norm_names(names: list[str]) -> list[str]:
+    """
+    Normalize a whole column of names in one pass.
+    Each distinct name is normalized only once, since HubSpot names repeat a lot;
+    above NORM_POOL_MIN distinct names the work is spread over all CPU cores,
+    if there is more than one.
+    """
+    distinct = list(set(names))
+    if len(distinct) > NORM_POOL_MIN and (os.cpu_count() or 1) > 1:
+        # regex work is CPU-bound and holds the GIL, so use processes
+        with multiprocessing.Pool() as pool:
+            lookup = dict(zip(distinct, pool.map(norm_name, distinct, chunksize=4096)))
+    else:
+        lookup = {n: norm_name(n) for n in distinct}
+    return [lookup[n] for n in names]
 
 # ---------- data fetching ----------
-def fetch_all_companies(s: requests.Session) -> list[dict]:
+def scan_watermark() -> str:
+    """
+    hs_lastmodifieddate the next --cache run fetches from, taken before a scan starts:
+    companies modified during the scan, or indexed late by search, are fetched again.
+    """
+    start = datetime.now(timezone.utc) - timedelta(seconds=CACHE_OVERLAP)
+    return start.isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+def company_row(cid, props: dict) -> tuple[str, str, str, str]:
+    """(id, name, domain, business_id) for one HubSpot company result."""
+    return (
+        str(cid),
+        (props.get("name") or "").strip(),
+        norm_domain(props.get("domain")),
+        (props.get("business_id") or "").strip(),
+    )
+
+def fetch_company_rows(s: requests.Session) -> tuple[dict[str, tuple], str]:
     """
-    Returns a list of dicts: {id, name, domain, business_id}.
+    Full scan of the company list.
+    Returns ({id: company_row}, scan_watermark() taken before the first page).
     """
-    out = []
+    rows: dict[str, tuple] = {}
+    watermark = scan_watermark()
     params = {
         "limit": PAGE_LIMIT,
         "archived": "false",
-        "properties": "name,domain,business_id",
+        "properties": ",".join(COMPANY_PROPERTIES),
     }
     url = BASE + COMPANY_LIST
     after = None
@@ -104,106 +198,276 @@ def fetch_all_companies(s: requests.Session) -> list[dict]:
         r = request_with_retry(s, "GET", url, params=params)
         if r.status_code != 200:
             raise RuntimeError(f"Company list error {r.status_code}: {r.text}")
-        data = r.json() if r.text else {}
+        data = orjson.loads(r.content) if r.content else {}
         results = data.get("results") or []
         for row in results:
             cid = row.get("id")
             props = row.get("properties") or {}
             if not cid:
                 continue
-            out.append(
-                {
-                    "id": str(cid),
-                    "name": (props.get("name") or "").strip(),
-                    "domain": norm_domain(props.get("domain")),
-                    "business_id": (props.get("business_id") or "").strip(),
-                }
-            )
+            rows[str(cid)] = company_row(cid, props)
         after = data.get("paging", {}).get("next", {}).get("after")
         if not after:
             break
 
-    return out
+    return rows, watermark
 
-def batch_read_associations_company_contacts(s: requests.Session, company_ids: list[str]) -> dict[str, list[str]]:
+def fetch_changed_company_rows(
+    s: requests.Session, since: str
+) -> tuple[dict[str, tuple], set[str], str]:
     """
-    Returns {company_id: [contact_ids]} using associations batch read.
+    Fetch companies modified at or after `since` (ISO timestamp) via the search API.
+    Returns ({id: company_row}, ids merged into the returned companies,
+    scan_watermark() taken before the first request).
+    Search stops paging after SEARCH_MAX_RESULTS hits, so the query is restarted
+    from the last timestamp seen whenever that limit is reached.
+    """
+    rows: dict[str, tuple] = {}
+    merged_away: set[str] = set()
+    watermark = scan_watermark()
+    last_modified = since
+    url = BASE + COMPANY_SEARCH
+
+    while True:
+        since_ms = int(datetime.fromisoformat(last_modified.replace("Z", "+00:00")).timestamp() * 1000)
+        body = {
+            "filterGroups": [{"filters": [
+                {"propertyName": "hs_lastmodifieddate", "operator": "GTE", "value": str(since_ms)}
+            ]}],
+            "sorts": [{"propertyName": "hs_lastmodifieddate", "direction": "ASCENDING"}],
+            "properties": COMPANY_PROPERTIES + ["hs_merged_object_ids"],
+            "limit": PAGE_LIMIT,
+        }
+        query_start = last_modified
+        while True:
+            r = request_with_retry(s, "POST", url, json=body)
+            if r.status_code != 200:
+                raise RuntimeError(f"Company search error {r.status_code}: {r.text}")
+            data = orjson.loads(r.content) if r.content else {}
+            for row in data.get("results") or []:
+                cid = row.get("id")
+                props = row.get("properties") or {}
+                if not cid:
+                    continue
+                rows[str(cid)] = company_row(cid, props)
+                merged = props.get("hs_merged_object_ids") or ""
+                merged_away.update(m for m in merged.split(";") if m)
+                last_modified = max(last_modified, props.get("hs_lastmodifieddate") or "")
+            after = data.get("paging", {}).get("next", {}).get("after")
+            if not after:
+                return rows, merged_away, watermark
+            if int(after) >= SEARCH_MAX_RESULTS:
+                break
+            body["after"] = after
+        if last_modified == query_start:
+            raise RuntimeError(
+                f"More than {SEARCH_MAX_RESULTS} companies share hs_lastmodifieddate {last_modified}; "
+                "run without --cache."
+            )
+
+def fetch_all_companies(s: requests.Session, cache_path: str | None = None) -> list[Company]:
+    """
+    Returns a list of Company tuples: (id, name, domain, business_id, norm_name).
+
+    With cache_path, companies from the previous run are loaded from that file and
+    only companies modified since then are fetched (companies merged into them are
+    dropped). The refreshed list is written back to cache_path.
+    """
+    if cache_path and os.path.isfile(cache_path):
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        rows = {row[0]: tuple(row) for row in cached["companies"]}
+        print(f"Loaded {len(rows)} companies from cache {cache_path}, fetching changes ...")
+        changed, merged_away, last_modified = fetch_changed_company_rows(s, cached["last_modified"])
+        for cid in merged_away:
+            rows.pop(cid, None)
+        rows.update(changed)
+        print(f"Updated {len(changed)} changed companies, dropped {len(merged_away)} merged ids.")
+    else:
+        rows, last_modified = fetch_company_rows(s)
+
+    if cache_path:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = cache_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"last_modified": last_modified, "companies": list(rows.values())}, f)
+        os.replace(tmp_path, cache_path)
+
+    # names are normalized as one column once all pages are in
+    row_list = list(rows.values())
+    norms = norm_names([row[1] for row in row_list])
+    return [Company(*row, nn) for row, nn in zip(row_list, norms)]
+
+def batch_read_associations_company_contacts(s: requests.Session, company_ids: list[str]) -> Associations:
+    """
+    Returns the company -> contacts associations (see Associations) using associations batch read.
     Handles HTTP 207 (Multi-Status) by parsing successes from 'results'.
     """
-    out: dict[str, list[str]] = defaultdict(list)
-    for i in range(0, len(company_ids), BATCH_SIZE):
-        chunk = company_ids[i:i + BATCH_SIZE]
+    from_ids: list[str] = []
+    offsets = array("q", [0])
+    contact_ids = array("q")
+
+    def fetch_chunk(chunk: list[str]) -> list[dict]:
         payload = {"inputs": [{"id": cid} for cid in chunk]}
         r = request_with_retry(s, "POST", BASE + ASSOC_BATCH_READ, json=payload)
 
         if r.status_code not in (200, 207):
             raise RuntimeError(f"Assoc batch read error {r.status_code}: {r.text}")
 
-        data = r.json() if r.text else {}
-        for row in (data.get("results") or []):
-            from_id = row.get("fromId")
-            tos = [t.get("toObjectId") for t in row.get("to", []) if t.get("toObjectId")]
-            if from_id and tos:
-                out[from_id].extend(tos)
+        data = orjson.loads(r.content) if r.content else {}
         # Optionally inspect per-item errors in data.get("errors")
+        return data.get("results") or []
 
-    return out
+    for results in run_batches(fetch_chunk, company_ids):
+        for row in results:
+            from_id = row.get("fromId")
+            tos = [int(t.get("toObjectId")) for t in row.get("to", []) if t.get("toObjectId")]
+            if not from_id or not tos:
+                continue
+            contact_ids.extend(tos)
+            if from_ids and from_ids[-1] == str(from_id):
+                # continuation of the previous company's row
+                offsets[-1] = len(contact_ids)
+            else:
+                from_ids.append(str(from_id))
+                offsets.append(len(contact_ids))
 
-def batch_read_contacts_emails(s: requests.Session, contact_ids: list[str]) -> dict[str, str]:
+    return Associations(from_ids, offsets, contact_ids)
+
+def batch_read_contacts_emails(s: requests.Session, contact_ids: list[int]) -> dict[int, str]:
     """
     Returns {contact_id: email} using contacts batch read.
     Handles HTTP 207 similarly by reading 'results'.
     """
-    out: dict[str, str] = {}
-    for i in range(0, len(contact_ids), BATCH_SIZE):
-        chunk = contact_ids[i:i + BATCH_SIZE]
+    out: dict[int, str] = {}
+
+    def fetch_chunk(chunk: list[int]) -> list[dict]:
         payload = {
             "properties": ["email"],
             "idProperty": "hs_object_id",
-            "inputs": [{"id": cid} for cid in chunk],
+            "inputs": [{"id": str(cid)} for cid in chunk],
         }
         r = request_with_retry(s, "POST", BASE + CONTACT_BATCH_READ, json=payload)
         if r.status_code not in (200, 207):
             raise RuntimeError(f"Contact batch read error {r.status_code}: {r.text}")
-        data = r.json() if r.text else {}
-        for row in (data.get("results") or []):
+        data = orjson.loads(r.content) if r.content else {}
+        return data.get("results") or []
+
+    for results in run_batches(fetch_chunk, contact_ids):
+        for row in results:
             rid = row.get("id")
             props = row.get("properties", {}) or {}
-            out[rid] = (props.get("email") or "").strip()
+            out[int(rid)] = (props.get("email") or "").strip()
     return out
 
 def derive_contact_domain_for_companies(
     s: requests.Session,
-    company_ids: list[str],
-    only_ids_without_domain: set[str] | None = None
+    ids_without_domain: set[str],
 ) -> dict[str, str]:
     """
-    For each company, derive the most common non-freemail email domain from associated contacts.
-    If only_ids_without_domain is provided, compute only for that subset.
-    Returns {company_id: contact_domain or ""}.
+    For each company in ids_without_domain, derive the most common non-freemail
+    email domain from associated contacts.
+    Returns {company_id: contact_domain} for companies where one was found.
     """
-    target_ids = list(only_ids_without_domain) if only_ids_without_domain else company_ids
-    if not target_ids:
-        return {cid: "" for cid in company_ids}
-
-    assoc = batch_read_associations_company_contacts(s, target_ids)
-    all_contact_ids = sorted({cid for ids in assoc.values() for cid in ids})
-    if not all_contact_ids:
-        return {cid: "" for cid in company_ids}
-
-    emails = batch_read_contacts_emails(s, all_contact_ids)
-
-    result: dict[str, str] = {cid: "" for cid in company_ids}
-    for comp_id, cids in assoc.items():
-        domains = [
-            d for d in (email_to_domain(emails.get(c)) for c in cids)
-            if d and d not in FREEMAIL
-        ]
-        if domains:
-            common, _ = Counter(domains).most_common(1)[0]
-            result[comp_id] = common
+    if not ids_without_domain:
+        return {}
+
+    assoc = batch_read_associations_company_contacts(s, list(ids_without_domain))
+    if not assoc.contact_ids:
+        return {}
+
+    emails = batch_read_contacts_emails(s, list(set(assoc.contact_ids)))
+
+    result: dict[str, str] = {}
+    offsets, contact_ids = assoc.offsets, assoc.contact_ids
+    for i, comp_id in enumerate(assoc.company_ids):
+        counts: dict[str, int] = {}
+        for c in contact_ids[offsets[i]:offsets[i + 1]]:
+            d = email_to_domain(emails.get(c))
+            if d and d not in FREEMAIL:
+                counts[d] = counts.get(d, 0) + 1
+        if counts:
+            # max() keeps the first-seen domain on ties, like Counter.most_common
+            result[comp_id] = max(counts, key=counts.get)
     return result
 
+def fuzzy_name_groups(companies: list[Company], threshold: float) -> dict[str, list[Company]]:
+    """
+    Group companies whose normalized names are near-duplicates but not equal.
+    Distinct names are blocked by (first character, length // 4); each block is
+    scored with token_set_ratio against itself and the next longer block, so
+    names a few characters apart are compared even across a block boundary.
+    Names scoring at least `threshold` are joined. Returns {smallest name in
+    component: companies} for components of two or more distinct names.
+    """
+    by_norm: dict[str, list[Company]] = defaultdict(list)
+    for c in companies:
+        if c.norm_name:
+            by_norm[c.norm_name].append(c)
+
+    blocks: dict[tuple[str, int], list[str]] = defaultdict(list)
+    for name in by_norm:
+        blocks[(name[0], len(name) // 4)].append(name)
+
+    uf = UnionFind()
+    skipped = 0
+    for (first, size), names in blocks.items():
+        choices = names + blocks.get((first, size + 1), [])
+        if len(choices) < 2:
+            continue
+        if len(choices) > FUZZY_BLOCK_MAX:
+            skipped += 1
+            continue
+        scores = process.cdist(
+            names, choices, scorer=fuzz.token_set_ratio, score_cutoff=threshold, workers=-1
+        )
+        # within the block each pair is scored twice (and against itself): keep i < j
+        scores[:, :len(names)] = np.triu(scores[:, :len(names)], 1)
+        for i, j in zip(*np.nonzero(scores)):
+            uf.union(names[i], choices[j])
+    if skipped:
+        print(f"Fuzzy name: skipped {skipped} blocks with more than {FUZZY_BLOCK_MAX} names to compare.")
+
+    groups: dict[str, list[Company]] = {}
+    for names in uf.groups().values():
+        if len(names) > 1:
+            groups[min(names)] = [c for name in names for c in by_norm[name]]
+    return groups
+
+def build_clusters(
+    dup_groups: dict[tuple[str, str], list[tuple[str, ...]]],
+) -> dict[tuple[str, str], list[tuple[str, ...]]]:
+    """
+    Collapse per-strategy duplicate groups into connected components: two
+    companies end up in the same cluster if any chain of groups links them.
+    Returns {(match_type, match_key): rows} in the same row layout, where
+    match_type is the comma-joined set of strategies that formed the cluster
+    and match_key is the cluster's smallest company id.
+    """
+    uf = UnionFind()
+    for rows in dup_groups.values():
+        first = rows[0][0]
+        for row in rows[1:]:
+            uf.union(first, row[0])
+
+    members: dict[str, dict[str, tuple[str, ...]]] = defaultdict(dict)
+    labels: dict[str, set[str]] = defaultdict(set)
+    for (label, _), rows in dup_groups.items():
+        root = uf.find(rows[0][0])
+        labels[root].add(label)
+        for row in rows:
+            members[root].setdefault(row[0], row)
+
+    clusters: dict[tuple[str, str], list[tuple[str, ...]]] = {}
+    for root, by_id in members.items():
+        match_type = ",".join(sorted(labels[root]))
+        match_key = min(by_id, key=lambda cid: (len(cid), cid))
+        clusters[(match_type, match_key)] = [
+            (cid, domain, name, bid, match_type, match_key)
+            for cid, domain, name, bid, _, _ in by_id.values()
+        ]
+    return clusters
+
 # ---------- main ----------
 def main():
     ap = argparse.ArgumentParser(
@@ -233,6 +497,37 @@ def main():
         action="store_true",
         help="Disable grouping by contact-derived domain.",
     )
+    ap.add_argument(
+        "--cache",
+        action="store_true",
+        help=(
+            f"Reuse the company list saved by the previous --cache run ({CACHE_PATH}) "
+            "and only fetch companies modified since then. Deleted companies are not "
+            "detected; remove the file to force a full fetch."
+        ),
+    )
+    ap.add_argument(
+        "--clusters",
+        action="store_true",
+        help=(
+            "Merge overlapping groups from all strategies into connected clusters and "
+            "write one row per company per cluster. match_type lists the contributing "
+            "strategies and match_key is the smallest company id in the cluster."
+        ),
+    )
+    ap.add_argument(
+        "--fuzzy-name",
+        nargs="?",
+        type=float,
+        const=FUZZY_NAME_THRESHOLD,
+        default=None,
+        metavar="THRESHOLD",
+        help=(
+            "Also group near-duplicate normalized names (rapidfuzz token_set_ratio "
+            f">= THRESHOLD, default {FUZZY_NAME_THRESHOLD}) within blocks of names "
+            "sharing the first character and similar length."
+        ),
+    )
     args = ap.parse_args()
 
     use_by_domain = not args.no_by_domain
@@ -244,10 +539,28 @@ def main():
     s = session_with_headers(token)
 
     print("Fetching companies ...")
-    companies = fetch_all_companies(s)
+    companies = fetch_all_companies(s, cache_path=CACHE_PATH if args.cache else None)
     total = len(companies)
-    no_domain_count = sum(1 for c in companies if not c["domain"])
-    print(f"Fetched {total} companies (without domain: {no_domain_count}).")
+    id_to_company = {c.id: c for c in companies}
+
+    # Single pass over all companies: grouping by domain, normalized name and
+    # business_id, plus the ids needed by the contact-domain step.
+    by_domain: dict[str, list[Company]] = defaultdict(list)
+    by_name: dict[str, list[Company]] = defaultdict(list)
+    by_business_id: dict[str, list[Company]] = defaultdict(list)
+    ids_without_domain: set[str] = set()
+
+    for c in companies:
+        if not c.domain:
+            ids_without_domain.add(c.id)
+        elif use_by_domain:
+            by_domain[c.domain].append(c)
+        if use_by_name and c.norm_name:
+            by_name[c.norm_name].append(c)
+        if use_by_business_id and c.business_id:
+            by_business_id[c.business_id].append(c)
+
+    print(f"Fetched {total} companies (without domain: {len(ids_without_domain)}).")
     print(
         f"Rules -> by_domain={use_by_domain}, "
         f"by_name={use_by_name}, "
@@ -255,64 +568,43 @@ def main():
         f"by_contact_domain={use_by_contact_domain}"
     )
 
-    # Grouping by domain, normalized name and business_id
-    by_domain: dict[str, list[dict]] = defaultdict(list)
-    by_name: dict[str, list[dict]] = defaultdict(list)
-    by_business_id: dict[str, list[dict]] = defaultdict(list)
-    all_company_ids: list[str] = []
-
-    for c in companies:
-        all_company_ids.append(c["id"])
-        if use_by_domain and c["domain"]:
-            by_domain[c["domain"]].append(c)
-        if use_by_name:
-            nn = norm_name(c["name"])
-            if nn:
-                by_name[nn].append(c)
-        if use_by_business_id:
-            bid = (c.get("business_id") or "").strip()
-            if bid:
-                by_business_id[bid].append(c)
-
     # Contact-derived domains for companies missing a domain only
-    by_contact_domain: dict[str, list[dict]] = defaultdict(list)
+    by_contact_domain: dict[str, list[Company]] = defaultdict(list)
     contact_domains: dict[str, str] = {}
     derived_count = 0
     if use_by_contact_domain:
         print("Deriving contact-based domains (associations + contact emails) .")
-        ids_without_domain = {c["id"] for c in companies if not c["domain"]}
-        contact_domains = derive_contact_domain_for_companies(
-            s, all_company_ids, only_ids_without_domain=ids_without_domain
-        )
-        for c in companies:
-            cd = contact_domains.get(c["id"], "")
-            if cd:
+        contact_domains = derive_contact_domain_for_companies(s, ids_without_domain)
+        for cid, cd in contact_domains.items():
+            c = id_to_company.get(str(cid))
+            if c:
                 derived_count += 1
                 by_contact_domain[cd].append(c)
         print(f"Derived contact-domain for {derived_count} companies (non-freemail).")
 
-    # Collect duplicate rows
-    dup_rows: list[list[str]] = []
+    # Duplicate rows, buffered per (match_type, match_key) group so the output
+    # only needs the groups sorted, plus each (small) group on its own.
+    dup_groups: dict[tuple[str, str], list[tuple[str, ...]]] = {}
 
     def add_grouping(group_dict, label: str):
         groups = 0
-        rows_before = len(dup_rows)
+        rows = 0
         for key, items in group_dict.items():
-            uniq = {i["id"]: i for i in items}
+            uniq = {i.id: i for i in items}
             if len(uniq) > 1:
                 groups += 1
-                for it in uniq.values():
-                    dup_rows.append(
-                        [
-                            it["id"],
-                            it["domain"],
-                            it["name"],
-                            (it.get("business_id") or "").strip(),
-                            label,
-                            key,
-                        ]
-                    )
-        return groups, len(dup_rows) - rows_before
+                rows += len(uniq)
+                dup_groups[(label, key)] = [
+                    (it.id, it.domain, it.name, it.business_id, label, key)
+                    for it in uniq.values()
+                ]
+        return groups, rows
+
+    by_name_then_id = itemgetter(2, 0)
+
+    def sorted_rows():
+        for group_key in sorted(dup_groups):
+            yield from sorted(dup_groups[group_key], key=by_name_then_id)
 
     g_dom = g_name = g_bid = g_cdom = 0
     r_dom = r_name = r_bid = r_cdom = 0
@@ -325,11 +617,20 @@ def main():
         g_bid, r_bid = add_grouping(by_business_id, "business_id")
     if use_by_contact_domain:
         g_cdom, r_cdom = add_grouping(by_contact_domain, "contact_domain")
+    g_fuzzy = r_fuzzy = 0
+    if args.fuzzy_name is not None:
+        print(f"Matching fuzzy names (threshold {args.fuzzy_name:g}) ...")
+        g_fuzzy, r_fuzzy = add_grouping(
+            fuzzy_name_groups(companies, args.fuzzy_name), "company_name_fuzzy"
+        )
 
-    if not dup_rows:
+    if not dup_groups:
         print("No duplicates found with the selected criteria.")
         return
 
+    if args.clusters:
+        dup_groups = build_clusters(dup_groups)
+
     # Write CSV
     ts = datetime.now().strftime("%Y%m%d-%H%M%S")
     os.makedirs("data", exist_ok=True)
@@ -339,10 +640,13 @@ def main():
         w.writerow(
             ["id", "domain", "name", "business_id", "match_type", "match_key"]
         )
-        for row in sorted(dup_rows, key=lambda r: (r[4], r[5], r[2], r[0])):
-            w.writerow(row)
+        w.writerows(sorted_rows())
 
-    print(f"\nSaved {len(dup_rows)} rows to {out_path}")
+    if args.clusters:
+        n_rows = sum(len(rows) for rows in dup_groups.values())
+        print(f"\nSaved {n_rows} rows ({len(dup_groups)} clusters) to {out_path}")
+    else:
+        print(f"\nSaved {r_dom + r_name + r_bid + r_cdom + r_fuzzy} rows to {out_path}")
     print(
         "Groups found -> "
         f"by_domain: {g_dom} (rows {r_dom}), "
@@ -350,6 +654,8 @@ def main():
         f"by_business_id: {g_bid} (rows {r_bid}), "
         f"contact_domain: {g_cdom} (rows {r_cdom})"
     )
+    if args.fuzzy_name is not None:
+        print(f"Fuzzy name groups: {g_fuzzy} (rows {r_fuzzy})")
     if use_by_contact_domain:
         print(
             "Note: contact_domain derived from associated contacts' emails "
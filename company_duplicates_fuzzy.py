@@ -2,14 +2,20 @@
 import argparse
 import csv
 import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, Any, List, Tuple, Optional, Set
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Tuple, Optional, FrozenSet
 
+import numpy as np
 from rapidfuzz import fuzz
+from rapidfuzz.process import cdist, cpdist
 
 
 # Common non-informative words we want to ignore when checking overlap
-STOPWORDS: Set[str] = {
+STOPWORDS: FrozenSet[str] = frozenset({
     "the",
     "of",
     "and",
@@ -47,7 +53,39 @@ STOPWORDS: Set[str] = {
     "institute",
     "instituutti",
     "institutet",
-}
+})
+
+
+# Output columns of the fuzzy pairs CSV
+PAIR_FIELDS = [
+    "id1",
+    "name1",
+    "domain1",
+    "normalized_name1",
+    "id2",
+    "name2",
+    "domain2",
+    "normalized_name2",
+    "score",
+    "block_type",
+    "block_key",
+]
+
+# Yleisimmät yhtiömuodot, jotka poistetaan NIMEN LOPUSTA. 'spa' jätetään pois,
+# koska se voi olla osa brändiä (esim. "ikaalinen spa") eikä italialainen yhtiömuoto.
+LEGAL_SUFFIXES = ("oy", "oyj", "ab", "as", "gmbh", "ltd", "inc", "sa", "nv", "bv", "srl")
+
+# "Heikommat" suffiksit, jotka ovat usein vain lisämääreitä brändin perässä,
+# eivätkä estä duplikaattien tunnistusta. Esim. "X Group" vs "X".
+WEAK_SUFFIXES = ("group",)
+
+# Trailing run of legal suffixes, optionally preceded by a run of weak suffixes,
+# matched on whole space-separated tokens: "x group oy" -> "x", "x oy group" -> "x oy".
+SUFFIX_RE = re.compile(
+    r"(?:^| )(?:(?:{w})(?: (?:{w}))*(?: (?:{l}))*|(?:{l})(?: (?:{l}))*)$".format(
+        w="|".join(WEAK_SUFFIXES), l="|".join(LEGAL_SUFFIXES)
+    )
+)
 
 
 def normalize_name(name: str) -> str:
@@ -67,45 +105,12 @@ def normalize_name(name: str) -> str:
 
     # Lowercase ja turhien välilyöntien poisto.
     # Esim. "  Oulun   Kuivaustekniikka   Group Oy  " -> "oulun kuivaustekniikka group oy"
-    s = name.strip().lower()
-    tokens = s.split()  # pilkotaan sanoiksi
-
-    # Yleisimmät yhtiömuodot, jotka poistetaan NIMEN LOPUSTA, jos ne esiintyvät
-    # viimeisenä tokenina. 'spa' jätetään pois, koska se voi olla osa brändiä
-    # (esim. "ikaalinen spa") eikä italialainen yhtiömuoto.
-    legal_suffixes = {
-        "oy",
-        "oyj",
-        "ab",
-        "as",
-        "gmbh",
-        "ltd",
-        "inc",
-        "sa",
-        "nv",
-        "bv",
-        "srl",
-    }
-
-    # Poista kaikki peräkkäiset yhtiömuotosuffiksit lopusta.
-    # Esim. ["oulun", "kuivaustekniikka", "group", "oy"] -> ["oulun", "kuivaustekniikka", "group"]
-    while tokens and tokens[-1] in legal_suffixes:
-        tokens.pop()
-
-    # "Heikommat" suffiksit, jotka ovat usein vain lisämääreitä brändin perässä,
-    # eivätkä estä duplikaattien tunnistusta. Esim. "X Group" vs "X".
-    weak_suffixes = {
-        "group",
-    }
-
-    # Poista peräkkäiset heikot suffiksit lopusta.
-    # Esim. ["oulun", "kuivaustekniikka", "group"] -> ["oulun", "kuivaustekniikka"]
-    while tokens and tokens[-1] in weak_suffixes:
-        tokens.pop()
-
-    # Kootaan normalisoitu nimi takaisin yhdeksi merkkijonoksi.
-    # Esim. ["oulun", "kuivaustekniikka"] -> "oulun kuivaustekniikka"
-    return " ".join(tokens)
+    s = " ".join(name.lower().split())
+
+    # Poista lopusta peräkkäiset yhtiömuodot ja niiden edeltä heikot suffiksit.
+    # Esim. "oulun kuivaustekniikka group oy" -> "oulun kuivaustekniikka"
+    m = SUFFIX_RE.search(s)
+    return s[: m.start()] if m else s
 
 def first_token(normalized_name: str) -> str:
     """
@@ -116,31 +121,32 @@ def first_token(normalized_name: str) -> str:
     return normalized_name.split()[0]
 
 
-def significant_tokens(normalized_name: str) -> Set[str]:
+def significant_tokens(normalized_name: str) -> FrozenSet[str]:
     """
     Return a set of 'significant' tokens from a normalized name,
     i.e. tokens not in STOPWORDS.
     """
     if not normalized_name:
-        return set()
-    tokens = normalized_name.split()
-    return {t for t in tokens if t not in STOPWORDS}
+        return frozenset()
+    return frozenset(t for t in normalized_name.split() if t not in STOPWORDS)
 
 
-def has_significant_token_overlap(norm1: str, norm2: str) -> bool:
+def has_significant_token_overlap(
+    sig1: FrozenSet[str], sig2: FrozenSet[str], norm1: str, norm2: str
+) -> bool:
     """
-    Check whether two normalized names share at least one non-stopword token.
+    Check whether two normalized names share at least one non-stopword token,
+    given their precomputed significant_tokens.
     This helps to avoid high scores for names like
     'university of the arts helsinki' vs 'university of oslo library'.
     """
-    sig1 = significant_tokens(norm1)
-    sig2 = significant_tokens(norm2)
     if not sig1 or not sig2:
         # If either side has no significant tokens, be conservative and require equality
         return norm1 == norm2
-    return len(sig1.intersection(sig2)) > 0
+    return not sig1.isdisjoint(sig2)
 
 
+@lru_cache(maxsize=None)
 def extract_domain_root(domain: str) -> str:
     """
     Extract a simple domain root from a full domain, trying to approximate
@@ -170,6 +176,7 @@ def extract_domain_root(domain: str) -> str:
 
 
 
+@lru_cache(maxsize=None)
 def domain_root_similarity(root1: str, root2: str) -> Optional[float]:
     """
     Compute similarity between two domain roots using WRatio.
@@ -180,71 +187,118 @@ def domain_root_similarity(root1: str, root2: str) -> Optional[float]:
     return float(fuzz.WRatio(root1, root2))
 
 
+class Companies:
+    """
+    Loaded companies stored column-wise: company i is ids[i], names[i], domains[i],
+    ... Buckets and pairs refer to companies by this row index.
+    """
+
+    def __init__(self) -> None:
+        self.ids: List[str] = []
+        self.names: List[str] = []
+        self.domains: List[str] = []
+        self.normalized_names: List[str] = []
+        self.first_tokens: List[str] = []
+        self.sig_tokens: List[FrozenSet[str]] = []
+        self.domain_lowers: List[str] = []
+        self.domain_roots: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
 def load_companies(
     path: str,
-) -> List[Dict[str, Any]]:
+) -> Companies:
     """
     Load companies from a semicolon-delimited CSV exported by export_all_companies.py.
     Expected columns:
         id;name;domain;createdate;hs_canonical_object_id;resolved_canonical_id;is_canonical
     """
-    companies: List[Dict[str, Any]] = []
+    rows: List[Tuple[str, str, str]] = []
 
     with open(path, "r", encoding="utf-8-sig", newline="") as f:
-        reader = csv.DictReader(f, delimiter=";")
+        reader = csv.reader(f, delimiter=";")
+        header = next(reader, [])
+        # Last occurrence wins for repeated headers, as with csv.DictReader
+        col = {h: i for i, h in enumerate(header)}
+        missing = [h for h in ("id", "name", "domain") if h not in col]
+        if missing:
+            raise RuntimeError(f"{path} is missing column(s): {', '.join(missing)}")
+        i_id, i_name, i_domain = col["id"], col["name"], col["domain"]
+        width = len(header)
+
         for row in reader:
-            cid = (row.get("id") or "").strip()
+            if len(row) < width:
+                # Short rows: missing trailing fields read as empty
+                row += [""] * (width - len(row))
+            cid = row[i_id].strip()
             if not cid:
                 continue
 
-            name = (row.get("name") or "").strip()
-            domain = (row.get("domain") or "").strip()
-
-            norm_name = normalize_name(name)
-            token = first_token(norm_name)
-            domain_lower = domain.strip().lower()
-
-            companies.append(
-                {
-                    "id": cid,
-                    "name": name,
-                    "domain": domain,
-                    "normalized_name": norm_name,
-                    "first_token": token,
-                    "domain_lower": domain_lower,
-                }
-            )
+            rows.append((cid, row[i_name].strip(), row[i_domain].strip()))
+
+    # Names repeat a lot in CRM data, so normalize each distinct name only once
+    # and share the derived fields between the rows that use it.
+    derived: Dict[str, Tuple[str, str, FrozenSet[str]]] = {}
+    for name in {name for _, name, _ in rows}:
+        norm_name = normalize_name(name)
+        derived[name] = (
+            norm_name,
+            # Interned: first tokens repeat across many names and key the buckets
+            sys.intern(first_token(norm_name)),
+            significant_tokens(norm_name),
+        )
+
+    companies = Companies()
+    for cid, name, domain in rows:
+        norm_name, token, sig_tokens = derived[name]
+        companies.ids.append(cid)
+        companies.names.append(name)
+        companies.domains.append(domain)
+        companies.normalized_names.append(norm_name)
+        companies.first_tokens.append(token)
+        companies.sig_tokens.append(sig_tokens)
+        companies.domain_lowers.append(sys.intern(domain.lower()))
+        companies.domain_roots.append(extract_domain_root(domain))
 
     print(f"Loaded {len(companies)} companies from {path}")
     return companies
 
 
 def build_buckets(
-    companies: List[Dict[str, Any]],
+    companies: Companies,
     max_bucket_size: int,
-) -> Dict[str, List[int]]:
+) -> Dict[str, np.ndarray]:
     """
     Build blocking buckets using:
       - first token of normalized name (token:<token>)
-      - domain (domain:<domain>)
-    Values in buckets are indices into the companies list.
+      - domain root, e.g. experis for no.experis.com (domainroot:<root>), or the
+        whole domain when it has a single label (domain:<domain>)
+    Values in buckets are int32 arrays of row indices into companies.
     Buckets larger than max_bucket_size are kept but will be skipped later.
     """
     buckets: Dict[str, List[int]] = {}
 
-    for idx, c in enumerate(companies):
-        token = c["first_token"]
-        domain_lower = c["domain_lower"]
-
+    for idx, (token, domain_lower, domain_root) in enumerate(
+        zip(companies.first_tokens, companies.domain_lowers, companies.domain_roots)
+    ):
         if token:
             key = f"token:{token}"
             buckets.setdefault(key, []).append(idx)
 
         if domain_lower:
-            key = f"domain:{domain_lower}"
+            # Bucket on the registered-domain root so that e.g. no.experis.com and
+            # experis.se meet; single-label domains keep the full domain.
+            if "." in domain_lower and domain_root:
+                key = f"domainroot:{domain_root}"
+            else:
+                key = f"domain:{domain_lower}"
             buckets.setdefault(key, []).append(idx)
 
     print(f"Built {len(buckets)} buckets from first token and domain.")
+    # Contiguous int32 index arrays instead of lists of boxed ints
+    buckets = {key: np.asarray(idxs, dtype=np.int32) for key, idxs in buckets.items()}
     large_buckets = sum(1 for b in buckets.values() if len(b) > max_bucket_size)
     if large_buckets:
         print(
@@ -255,25 +309,64 @@ def build_buckets(
     return buckets
 
 
+def score_names(
+    names: List[str], min_score: float
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Score all pairs of names in one bucket with WRatio.
+    Returns (rows, cols, scores) for the pairs i < j scoring >= min_score,
+    in row-major order. float64 keeps the exact WRatio values used for the
+    score column.
+    Repeated names are scored once and the matrix is expanded back afterwards,
+    so a bucket full of identical names costs one WRatio call instead of k^2.
+    """
+    position: Dict[str, int] = {}
+    inverse = [position.setdefault(name, len(position)) for name in names]
+    distinct = list(position)
+
+    scores = cdist(
+        distinct, distinct, scorer=fuzz.WRatio, score_cutoff=min_score,
+        dtype=np.float64, workers=1,
+    )
+    if len(distinct) < len(names):
+        inv = np.asarray(inverse)
+        scores = scores[np.ix_(inv, inv)]
+
+    rows, cols = np.nonzero(np.triu(scores >= min_score, k=1))
+    return rows, cols, scores[rows, cols]
+
+
 def generate_pairs(
-    companies: List[Dict[str, Any]],
-    buckets: Dict[str, List[int]],
+    companies: Companies,
+    buckets: Dict[str, np.ndarray],
     min_score: float,
     max_bucket_size: int,
     max_pairs: Optional[int] = None,
-) -> List[Dict[str, Any]]:
+) -> Iterator[Tuple[str, ...]]:
     """
     Generate fuzzy duplicate candidate pairs using WRatio.
     Only pairs with:
       - significant token overlap AND
       - score >= min_score AND
       - pass domain-root heuristics
-    are returned.
+    are yielded as PAIR_FIELDS-ordered tuples, so they can be written out as
+    they are found.
     Uses buckets to limit comparisons.
     """
-    pairs: List[Dict[str, Any]] = []
-    seen_pairs: Set[Tuple[str, str]] = set()
-
+    pair_count = 0
+
+    ids = companies.ids
+    names = companies.names
+    domains = companies.domains
+    norms = companies.normalized_names
+    sig_tokens = companies.sig_tokens
+    domain_roots = companies.domain_roots
+
+    # A company sits in at most two buckets, its first token and its domain, so a
+    # pair was already scored exactly when both rows share an earlier bucket.
+    # earlier[row] is the ordinal of the scored bucket a row first appeared in.
+    earlier = np.full(len(ids), -1, dtype=np.int32)
+    scored_buckets: List[Tuple[str, np.ndarray, Optional[np.ndarray]]] = []
     for bucket_key, indices in buckets.items():
         n = len(indices)
         if n < 2:
@@ -285,112 +378,130 @@ def generate_pairs(
             )
             continue
 
-        block_type = "token" if bucket_key.startswith("token:") else "domain"
-
-        for i in range(n):
-            idx1 = indices[i]
-            c1 = companies[idx1]
-            id1 = c1["id"]
-            name1 = c1["name"]
-            domain1 = c1["domain"]
-            norm1 = c1["normalized_name"]
+        prev = earlier[indices]
+        _, counts = np.unique(prev[prev >= 0], return_counts=True)
+        if counts.size == 1 and counts[0] == n:
+            # Every pair was scored in one earlier bucket, e.g. a token and a
+            # domain bucket holding the same companies
+            continue
+        earlier[indices] = np.where(prev >= 0, prev, len(scored_buckets))
+        if not (counts.size and counts.max() > 1):
+            # No two members met before, the whole bucket is scored
+            prev = None
 
-            for j in range(i + 1, n):
-                idx2 = indices[j]
-                c2 = companies[idx2]
-                id2 = c2["id"]
-                name2 = c2["name"]
-                domain2 = c2["domain"]
-                norm2 = c2["normalized_name"]
+        scored_buckets.append((bucket_key, indices, prev))
 
+    def score_bucket(indices: np.ndarray, prev: Optional[np.ndarray]):
+        if prev is None:
+            rows, cols, scores = score_names(
+                [norms[idx] for idx in indices.tolist()], min_score
+            )
+        else:
+            # Only the pairs that do not share an earlier bucket are scored
+            rows, cols = np.triu_indices(len(indices), k=1)
+            new = (prev[rows] != prev[cols]) | (prev[rows] < 0)
+            rows, cols = rows[new], cols[new]
+            scores = cpdist(
+                [norms[idx] for idx in indices[rows].tolist()],
+                [norms[idx] for idx in indices[cols].tolist()],
+                scorer=fuzz.WRatio, score_cutoff=min_score,
+                dtype=np.float64, workers=1,
+            )
+            keep = scores >= min_score
+            rows, cols, scores = rows[keep], cols[keep], scores[keep]
+        return indices[rows].tolist(), indices[cols].tolist(), scores.tolist()
+
+    # Buckets are scored concurrently (rapidfuzz releases the GIL) but consumed
+    # in order, so max_pairs behaves exactly as in a serial loop.
+    executor = ThreadPoolExecutor(max_workers=os.cpu_count())
+    try:
+        results = executor.map(
+            score_bucket,
+            [indices for _, indices, _ in scored_buckets],
+            [prev for _, _, prev in scored_buckets],
+        )
+        for (bucket_key, _, _), scored in zip(scored_buckets, results):
+            is_token_block = bucket_key.startswith("token:")
+            block_type = "token" if is_token_block else "domain"
+            for idx1, idx2, score in zip(*scored):
+                id1 = ids[idx1]
+                id2 = ids[idx2]
                 if id1 == id2:
                     continue
 
-                pair_key = (id1, id2) if id1 < id2 else (id2, id1)
-                if pair_key in seen_pairs:
-                    continue
-                seen_pairs.add(pair_key)
+                norm1 = norms[idx1]
+                norm2 = norms[idx2]
 
-                # Require significant token overlap, otherwise skip early
-                if not has_significant_token_overlap(norm1, norm2):
+                # Require significant token overlap
+                if not has_significant_token_overlap(
+                    sig_tokens[idx1], sig_tokens[idx2], norm1, norm2
+                ):
                     continue
 
-                # Compute WRatio similarity between normalized names
-                score = float(fuzz.WRatio(norm1, norm2))
-                if score < min_score:
-                    continue
-
-                # Domain-root heuristics: only applied if both sides have domain roots
-                root1 = extract_domain_root(domain1)
-                root2 = extract_domain_root(domain2)
-                root_score = domain_root_similarity(root1, root2)
-
+                # Domain-root heuristics: only applied if both sides have domain roots.
                 # Only apply domain check when names are not identical.
                 # Identical normalized names (e.g. "audionova" vs "audionova")
-                # are allowed regardless of domain root.
-                if norm1 != norm2 and root_score is not None:
-                    # Length-based penalty: big difference in root length lowers trust
-                    length_diff = abs(len(root1) - len(root2))
-                    adjusted_root_score = root_score - length_diff * 5.0
-
-                    # Strong domain disagreement: discard
-                    if adjusted_root_score < 60.0:
-                        continue
-
-                    # Moderate disagreement + not extremely high name score: discard
-                    if adjusted_root_score < 80.0 and score < 98.0:
-                        continue
-
-                pair = {
-                    "id1": id1,
-                    "name1": name1,
-                    "domain1": domain1,
-                    "normalized_name1": norm1,
-                    "id2": id2,
-                    "name2": name2,
-                    "domain2": domain2,
-                    "normalized_name2": norm2,
-                    "score": f"{score:.1f}",
-                    "block_type": block_type,
-                    "block_key": bucket_key,
-                }
-                pairs.append(pair)
-
-                if max_pairs is not None and len(pairs) >= max_pairs:
+                # are allowed regardless of domain root. Pairs from a domain
+                # bucket share the same root by construction, so the check
+                # always passes for them and is skipped.
+                if is_token_block and norm1 != norm2:
+                    root1 = domain_roots[idx1]
+                    root2 = domain_roots[idx2]
+                    root_score = domain_root_similarity(root1, root2)
+                    if root_score is not None:
+                        # Length-based penalty: big difference in root length lowers trust
+                        length_diff = abs(len(root1) - len(root2))
+                        adjusted_root_score = root_score - length_diff * 5.0
+
+                        # Strong domain disagreement: discard
+                        if adjusted_root_score < 60.0:
+                            continue
+
+                        # Moderate disagreement + not extremely high name score: discard
+                        if adjusted_root_score < 80.0 and score < 98.0:
+                            continue
+
+                # Columns in PAIR_FIELDS order
+                pair = (
+                    id1,
+                    names[idx1],
+                    domains[idx1],
+                    norm1,
+                    id2,
+                    names[idx2],
+                    domains[idx2],
+                    norm2,
+                    f"{score:.1f}",
+                    block_type,
+                    bucket_key,
+                )
+                pair_count += 1
+                yield pair
+
+                if max_pairs is not None and pair_count >= max_pairs:
                     print(
                         f"Max pairs limit {max_pairs} reached during generation. "
                         f"Stopping early."
                     )
-                    return pairs
+                    return
+    finally:
+        executor.shutdown(cancel_futures=True)
 
-    print(f"Generated {len(pairs)} candidate pairs with score >= {min_score}.")
-    return pairs
+    print(f"Generated {pair_count} candidate pairs with score >= {min_score}.")
 
 
-def write_pairs_csv(path: str, pairs: List[Dict[str, Any]]) -> None:
+def write_pairs_csv(path: str, pairs: Iterable[Tuple[str, ...]]) -> None:
     os.makedirs(os.path.dirname(path), exist_ok=True)
 
-    fieldnames = [
-        "id1",
-        "name1",
-        "domain1",
-        "normalized_name1",
-        "id2",
-        "name2",
-        "domain2",
-        "normalized_name2",
-        "score",
-        "block_type",
-        "block_key",
-    ]
-
     with open(path, "w", encoding="utf-8", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames, delimiter=";")
-        writer.writeheader()
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(PAIR_FIELDS)
+        count = 0
         for row in pairs:
             writer.writerow(row)
+            count += 1
 
-    print(f"Wrote {len(pairs)} pairs to {path}")
+    print(f"Wrote {count} pairs to {path}")
 
 
 def parse_args() -> argparse.Namespace:
@@ -451,6 +562,7 @@ def main() -> None:
 
     buckets = build_buckets(companies, max_bucket_size=args.max_bucket_size)
 
+    # Pairs are streamed straight into the CSV as they are generated
     pairs = generate_pairs(
         companies=companies,
         buckets=buckets,
@@ -22,12 +22,19 @@ import csv
 import os
 import re
 import sys
-from collections import defaultdict
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from typing import Dict, List, Tuple
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
+import orjson
 import requests
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+from dedup_utils import hubspot_request
+from merge_by_name import CANONICAL_CACHE, FORWARD_REF_RE
 
 BASE = "https://api.hubapi.com"
 BATCH_READ = "/crm/v3/objects/companies/batch/read"
@@ -35,29 +42,29 @@ MERGE = "/crm/v3/objects/companies/merge"
 
 MAX_BATCH = 100
 TIMEOUT = 30
+MAX_WORKERS = 8  # concurrent batch reads / merge calls within one group
+POOL_SIZE = 16   # keep-alive connections per host
 
-FORWARD_REF_RE = re.compile(r"forward reference to (\d+)")
+# Columns read from the duplicate CSV; everything else is ignored
+CSV_COLUMNS = ("id", "match_type", "group_key", "match_key", "domain", "name", "contact_domain")
+DELIMITERS = ";,|\t"  # candidates for sniff_delimiter; ties go to the first
+_WS_RE = re.compile(r"[\s\u00A0]+")
+_PUNCT_TABLE = str.maketrans("", "", ".,;:!?'\"()\\/[]{}&|")
 
 
+@lru_cache(maxsize=65536)  # duplicate CSVs repeat the same names across rows
 def normalize_name(s: str) -> str:
     """Lowercase, collapse whitespace, strip common punctuation."""
     if not s:
         return ""
-    s = s.lower()
-    s = re.sub(r"[\s\u00A0]+", " ", s)
-    s = re.sub(r"[.,;:!?'\"()\\/\[\]{}&|]", "", s)
-    s = s.strip()
-    return s
+    return _WS_RE.sub(" ", s.lower()).translate(_PUNCT_TABLE).strip()
 
 
 def sniff_delimiter(path: str) -> str:
-    with open(path, "r", encoding="utf-8", newline="") as f:
-        sample = f.read(2048)
-    try:
-        dialect = csv.Sniffer().sniff(sample, delimiters=";,|\t,")
-        return dialect.delimiter
-    except csv.Error:
-        return ";"
+    """Pick the candidate delimiter that occurs most often in the header line (default ';')."""
+    with open(path, "rb") as f:
+        header = f.readline()
+    return max(DELIMITERS, key=lambda d: header.count(d.encode()))
 
 
 def chunks(lst, n):
@@ -65,11 +72,19 @@ def chunks(lst, n):
         yield lst[i:i + n]
 
 
-def http_request(session: requests.Session, method: str, url: str, headers: Dict, **kwargs) -> requests.Response:
-    return session.request(method, url, timeout=TIMEOUT, headers=headers, **kwargs)
+def parse_createdate(raw: str) -> Optional[datetime]:
+    """Parse a HubSpot timestamp into a naive UTC datetime, or None if it is not ISO-8601."""
+    try:
+        if raw.endswith("Z"):
+            # HubSpot's usual form is already UTC: parse it naive, no tz round trip
+            return datetime.fromisoformat(raw[:-1])
+        # parse as aware, convert to UTC, then drop tzinfo to get naive UTC
+        return datetime.fromisoformat(raw).astimezone(timezone.utc).replace(tzinfo=None)
+    except Exception:
+        return None
 
 
-def batch_fetch_company_details(session: requests.Session, headers: Dict, ids: List[str]) -> Dict[str, Dict]:
+def batch_fetch_company_details(session: requests.Session, ids: List[str]) -> Dict[str, Dict]:
     """
     Return mapping:
       id -> {
@@ -83,32 +98,32 @@ def batch_fetch_company_details(session: requests.Session, headers: Dict, ids: L
     If an id is invalid or already merged away, it simply does not appear
     in the returned mapping.
     """
-    out: Dict[str, Dict] = {}
-    for part in chunks(ids, MAX_BATCH):
+    def fetch_chunk(part: List[str]) -> List[Dict]:
         payload = {
             "idProperty": "hs_object_id",
             "properties": ["name", "domain", "createdate", "hs_canonical_object_id"],
             "inputs": [{"id": i} for i in part],
         }
-        r = http_request(session, "POST", BASE + BATCH_READ, headers, json=payload)
+        r = hubspot_request(session, "POST", BASE + BATCH_READ, json=payload, timeout=TIMEOUT)
         if r.status_code != 200:
             raise RuntimeError(f"Batch read error {r.status_code}: {r.text}")
-        data = r.json()
-        for row in data.get("results", []):
+        return orjson.loads(r.content).get("results", [])
+
+    # Chunks are independent, so they are read concurrently; map() keeps chunk order.
+    parts = list(chunks(ids, MAX_BATCH))
+    if len(parts) > 1:
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+            chunk_results = list(ex.map(fetch_chunk, parts))
+    else:
+        chunk_results = [fetch_chunk(p) for p in parts]
+
+    out: Dict[str, Dict] = {}
+    for results in chunk_results:
+        for row in results:
             cid = row["id"]
             props = row.get("properties", {}) or {}
             created_raw = props.get("createdate")
-            created_dt = None
-            if created_raw:
-                try:
-                    # parse as aware, convert to UTC, then drop tzinfo to get naive UTC
-                    created_dt = (
-                        datetime.fromisoformat(created_raw.replace("Z", "+00:00"))
-                        .astimezone(timezone.utc)
-                        .replace(tzinfo=None)
-                    )
-                except Exception:
-                    created_dt = None
+            created_dt = parse_createdate(created_raw) if created_raw else None
             canonical = props.get("hs_canonical_object_id") or cid
             out[cid] = {
                 "name": props.get("name", ""),
@@ -122,7 +137,6 @@ def batch_fetch_company_details(session: requests.Session, headers: Dict, ids: L
 
 def merge_pair(
     session: requests.Session,
-    headers: Dict,
     primary_id: str,
     secondary_id: str,
     dry_run: bool,
@@ -140,9 +154,11 @@ def merge_pair(
         return True, "DRY_RUN"
 
     payload = {"primaryObjectId": primary_id, "objectIdToMerge": secondary_id}
-    r = http_request(session, "POST", BASE + MERGE, headers, json=payload)
+    r = hubspot_request(session, "POST", BASE + MERGE, json=payload, timeout=TIMEOUT)
 
     if r.status_code == 200:
+        # The secondary now points to the primary, its cached canonical hop is stale
+        CANONICAL_CACHE.invalidate(secondary_id)
         return True, "MERGED"
     if r.status_code in (404, 410):
         # Already merged away or not found
@@ -150,9 +166,65 @@ def merge_pair(
     return False, f"error {r.status_code}: {r.text}"
 
 
-def build_groups(rows: List[Dict[str, str]]) -> Dict[Tuple[str, str], List[Dict[str, str]]]:
+def primary_sort_key(cid: str, info: Dict) -> Tuple[datetime, int]:
+    """Order primary candidates by oldest createdate (missing = last), then lowest numeric id."""
+    created = info.get("createdate")
+    created_ord = created if created is not None else datetime.max  # all naive UTC
+    try:
+        numeric_id = int(cid)
+    except ValueError:
+        numeric_id = 10**20
+    return (created_ord, numeric_id)
+
+
+def make_group_key(columns: Iterable[str]) -> Callable[[Dict[str, str]], Tuple[str, str]]:
+    """
+    Return the row -> (match_type, key_value) function used by build_groups,
+    specialized once for the columns present in the CSV: the group_key and
+    match_key checks are only chained in when those columns exist, and the
+    domain/name columns are only read by the branch that uses them.
+    """
+    columns = set(columns)
+
+    def by_match_type(r: Dict[str, str]) -> Tuple[str, str]:
+        mt = (r.get("match_type") or "").strip()
+        if mt == "company_name":
+            return ("company_name", normalize_name(r.get("name", "")))
+        # domains repeat across rows; interned keys hash and compare by identity
+        if mt == "contact_domain":
+            return ("contact_domain", sys.intern((r.get("contact_domain") or "").lower().strip()))
+        domain = sys.intern((r.get("domain") or "").lower().strip())
+        if mt == "company_domain" or mt == "":
+            return ("company_domain", domain)
+        inner_key = domain or (r.get("contact_domain") or "").lower().strip() or normalize_name(r.get("name", ""))
+        return (mt, inner_key.lower() if inner_key else "")
+
+    key_for = by_match_type
+    if "match_key" in columns:
+        def by_match_key(r: Dict[str, str], fallback=key_for) -> Tuple[str, str]:
+            mkey = (r.get("match_key") or "").strip()
+            if mkey:
+                return ((r.get("match_type") or "").strip() or "match", mkey.lower())
+            return fallback(r)
+
+        key_for = by_match_key
+    if "group_key" in columns:
+        def by_group_key(r: Dict[str, str], fallback=key_for) -> Tuple[str, str]:
+            gid = (r.get("group_key") or "").strip()
+            if gid:
+                return ("group", gid.lower())
+            return fallback(r)
+
+        key_for = by_group_key
+    return key_for
+
+
+def build_groups(
+    rows: Iterable[Dict[str, str]], columns: Iterable[str] = CSV_COLUMNS
+) -> Dict[Tuple[str, str], List[Dict[str, str]]]:
     """
     Build groups keyed by (match_type, key_value) -> list(rows).
+    columns are the CSV's header names (default: assume every column may be present).
 
     Priority when choosing the key:
       1) if 'group_key' exists and not empty, use ('group', group_key)
@@ -164,32 +236,15 @@ def build_groups(rows: List[Dict[str, str]]) -> Dict[Tuple[str, str], List[Dict[
 
     Only groups with > 1 row and non-empty key are kept.
     """
-    groups: Dict[Tuple[str, str], List[Dict[str, str]]] = defaultdict(list)
+    key_for = make_group_key(columns)
+    groups: Dict[Tuple[str, str], List[Dict[str, str]]] = {}
 
     for r in rows:
-        mt = (r.get("match_type") or "").strip()
-        gid = (r.get("group_key") or "").strip()
-        mkey = (r.get("match_key") or "").strip()
-
-        domain = (r.get("domain") or "").lower().strip()
-        name = r.get("name", "")
-        contact_domain = (r.get("contact_domain") or "").lower().strip()
-
-        if gid:
-            key = ("group", gid.lower())
-        elif mkey:
-            key = (mt or "match", mkey.lower())
-        elif mt == "company_name":
-            key = ("company_name", normalize_name(name))
-        elif mt == "contact_domain":
-            key = ("contact_domain", contact_domain)
-        elif mt == "company_domain" or mt == "":
-            key = ("company_domain", domain)
-        else:
-            inner_key = domain or contact_domain or normalize_name(name)
-            key = (mt, inner_key.lower() if inner_key else "")
-
-        groups[key].append(r)
+        key = key_for(r)
+        lst = groups.get(key)
+        if lst is None:
+            lst = groups[key] = []
+        lst.append(r)
 
     pruned = {}
     for (mt, key), lst in groups.items():
@@ -198,18 +253,33 @@ def build_groups(rows: List[Dict[str, str]]) -> Dict[Tuple[str, str], List[Dict[
     return pruned
 
 
-def load_csv(path: str) -> List[Dict[str, str]]:
+def csv_columns(path: str, delimiter: Optional[str] = None) -> List[str]:
+    """Return the lowercased header names of the CSV."""
     if not os.path.isfile(path):
         raise FileNotFoundError(path)
-    delim = sniff_delimiter(path)
     with open(path, "r", encoding="utf-8", newline="") as f:
-        reader = csv.DictReader(f, delimiter=delim)
-        if reader.fieldnames:
-            reader.fieldnames = [h.lower() for h in reader.fieldnames]
-        out = []
+        return [h.lower() for h in next(csv.reader(f, delimiter=delimiter or sniff_delimiter(path)), [])]
+
+
+def iter_csv(path: str, delimiter: Optional[str] = None) -> Iterator[Dict[str, str]]:
+    """
+    Yield CSV rows one at a time as {column: stripped value}, limited to CSV_COLUMNS.
+    Header names are matched case-insensitively; columns missing from a row are
+    left out. The delimiter is detected from the header line unless given.
+    """
+    if not os.path.isfile(path):
+        raise FileNotFoundError(path)
+    delim = delimiter or sniff_delimiter(path)
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f, delimiter=delim)
+        header = [h.lower() for h in next(reader, [])]
+        position = {h: i for i, h in enumerate(header)}  # last one wins on repeats
+        columns = [(name, position[name]) for name in CSV_COLUMNS if name in position]
         for row in reader:
-            out.append({(k.lower() if k else k): (v.strip() if isinstance(v, str) else v) for k, v in row.items()})
-        return out
+            if not row:
+                continue
+            n = len(row)
+            yield {name: row[i].strip() for name, i in columns if i < n}
 
 
 def main():
@@ -219,6 +289,10 @@ def main():
         help="Path to CSV with at least 'id' and one of: domain, name, contact_domain, or group_key.",
     )
     parser.add_argument("--apply", action="store_true", help="Perform merges (otherwise dry-run).")
+    parser.add_argument(
+        "--delimiter",
+        help="CSV delimiter. Default: detected from the header line (';', ',', '|' or tab).",
+    )
     args = parser.parse_args()
 
     load_dotenv()
@@ -226,36 +300,54 @@ def main():
     if not token:
         print("Missing HUBSPOT_TOKEN in .env")
         sys.exit(2)
-
-    rows = load_csv(args.csv_path)
-    if not rows:
+    if args.apply:
+        # Merged companies are dropped from data/.canonical_cache.json
+        CANONICAL_CACHE.load()
+
+    # Read, group and collect IDs in one streaming pass over the CSV
+    csv_ids: Set[str] = set()
+    row_count = 0
+
+    def rows_collecting_ids():
+        nonlocal row_count
+        for r in iter_csv(args.csv_path, args.delimiter):
+            row_count += 1
+            if r.get("id"):
+                csv_ids.add(r["id"])
+            yield r
+
+    groups = build_groups(rows_collecting_ids(), csv_columns(args.csv_path, args.delimiter))
+    if not row_count:
         print("CSV is empty")
         sys.exit(1)
-
-    groups = build_groups(rows)
     if not groups:
         print("CSV does not contain any groups with more than one ID.")
         sys.exit(0)
 
-    all_ids = sorted({r["id"] for r in rows if r.get("id")})
+    all_ids = list(csv_ids)  # batch reads are order-independent
     session = requests.Session()
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json",
-        "Accept-Encoding": "gzip, deflate",
-    }
-
-    details = batch_fetch_company_details(session, headers, all_ids)
+    # Reuse keep-alive connections for all batch reads and concurrent merges
+    session.mount("https://", HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE))
+    session.headers.update(
+        {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+            "Accept-Encoding": "gzip, deflate",
+        }
+    )
 
-    canonical_ids = set()
-    for cid, info in details.items():
-        canonical_ids.add(info["canonical_id"])
+    details = batch_fetch_company_details(session, all_ids)
 
-    missing_canonical = [cid for cid in canonical_ids if cid not in details]
+    # canonical roots that were not in the CSV need their own (usually single-chunk) read
+    canonical_ids = {info["canonical_id"] for info in details.values()}
+    missing_canonical = list(canonical_ids - details.keys())
     if missing_canonical:
-        extra = batch_fetch_company_details(session, headers, missing_canonical)
+        extra = batch_fetch_company_details(session, missing_canonical)
         details.update(extra)
 
+    # primary choice keys, computed once per company instead of per group comparison
+    sort_keys = {cid: primary_sort_key(cid, info) for cid, info in details.items()}
+
     # prepare logging
     os.makedirs("logs", exist_ok=True)
     os.makedirs("data", exist_ok=True)
@@ -269,7 +361,16 @@ def main():
     total_merges_applied = 0
     total_merges_planned = 0
 
-    with open(log_path, "w", newline="", encoding="utf-8") as log_f:
+    executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+
+    def merge_all(primary_id: str, secondary_ids: List[str]):
+        """Merge secondaries into primary concurrently; yields (ok, info) in input order."""
+        return executor.map(
+            lambda sid: merge_pair(session, primary_id, sid, dry_run=(not args.apply)),
+            secondary_ids,
+        )
+
+    with executor, open(log_path, "w", newline="", encoding="utf-8") as log_f:
         log_writer = csv.writer(log_f, delimiter=";")
         log_writer.writerow(
             [
@@ -283,10 +384,19 @@ def main():
             ]
         )
 
+        # the timestamp has one-second resolution, so it is formatted once per second
+        log_second = 0
+        log_stamp = ""
+
         def log_action(group_type: str, group_key: str, primary_id: str, secondary_id: str, action: str, info: str):
+            nonlocal log_second, log_stamp
+            now = int(time.time())
+            if now != log_second:
+                log_second = now
+                log_stamp = datetime.fromtimestamp(now).isoformat(timespec="seconds")
             log_writer.writerow(
                 [
-                    datetime.now().isoformat(timespec="seconds"),
+                    log_stamp,
                     group_type,
                     group_key,
                     primary_id,
@@ -357,17 +467,10 @@ def main():
                 print(f"=== Group: {mt} = {key} — no IDs with details, skipping.")
                 continue
 
-            def sort_key_for_primary(cid: str):
-                info = details.get(cid, {})
-                created = info.get("createdate")
-                created_ord = created if created is not None else datetime.max  # all naive UTC
-                try:
-                    numeric_id = int(cid)
-                except ValueError:
-                    numeric_id = 10**20
-                return (created_ord, numeric_id)
-
-            primary_id = sorted(canonical_roots, key=sort_key_for_primary)[0]
+            primary_id = min(
+                canonical_roots,
+                key=lambda cid: sort_keys[cid] if cid in sort_keys else primary_sort_key(cid, {}),
+            )
             primary_info = details.get(primary_id, {})
             primary_created = primary_info.get("createdate_raw")
             primary_name = primary_info.get("name", "")
@@ -379,94 +482,50 @@ def main():
 
             merged_secondaries = set()
 
-            # First, merge other canonical roots into the primary
-            for root_id in canonical_roots:
-                if root_id == primary_id:
-                    continue
-                if root_id not in details:
-                    msg = "no details returned by HubSpot"
-                    print(f"    SKIPPED_MISSING_ROOT: {root_id} ({msg})")
-                    log_action(mt, key, primary_id, root_id, "SKIPPED_MISSING_ROOT", msg)
-                    add_manual_review_row(
-                        group_type=mt,
-                        group_key=key,
-                        primary_id=primary_id,
-                        secondary_id=root_id,
-                        canonical_id=root_id,
-                        error=msg,
-                    )
-                    continue
-                ok, info_str = merge_pair(session, headers, primary_id, root_id, dry_run=(not args.apply))
-                if not ok and info_str == "MISSING":
-                    msg = "HubSpot returned not found"
-                    print(f"    SKIPPED_MISSING_ROOT: {root_id} ({msg})")
-                    log_action(mt, key, primary_id, root_id, "SKIPPED_MISSING_ROOT", msg)
-                    add_manual_review_row(
-                        group_type=mt,
-                        group_key=key,
-                        primary_id=primary_id,
-                        secondary_id=root_id,
-                        canonical_id=root_id,
-                        error=msg,
-                    )
-                    continue
-                action = "MERGED" if args.apply and ok else ("DRY_RUN" if not args.apply and ok else "SKIPPED")
-                print(
-                    f"    {action}: {root_id} -> {primary_id}"
-                    f"{'' if info_str in ('MERGED', 'DRY_RUN', 'SAME_ID') else ' | ' + info_str}"
-                )
-                log_action(mt, key, primary_id, root_id, action, info_str)
-                if not ok and info_str.startswith("error 400") and "forward reference to" in info_str:
-                    collect_forward_reference(mt, key, primary_id, root_id, info_str)
-                if ok:
-                    merged_secondaries.add(root_id)
-                    total_merges_planned += 1
-                    if args.apply and info_str == "MERGED":
-                        total_merges_applied += 1
-
-            # Then, merge all CSV IDs into the same primary
-            for cid in ids_in_group:
-                if cid == primary_id or cid in merged_secondaries:
-                    continue
-                if cid not in details:
-                    msg = "no details returned by HubSpot"
-                    print(f"    SKIPPED_MISSING: {cid} ({msg})")
-                    log_action(mt, key, primary_id, cid, "SKIPPED_MISSING", msg)
-                    add_manual_review_row(
-                        group_type=mt,
-                        group_key=key,
-                        primary_id=primary_id,
-                        secondary_id=cid,
-                        canonical_id="",
-                        error=msg,
-                    )
-                    continue
-                ok, info_str = merge_pair(session, headers, primary_id, cid, dry_run=(not args.apply))
-                if not ok and info_str == "MISSING":
-                    msg = "HubSpot returned not found"
-                    print(f"    SKIPPED_MISSING: {cid} ({msg})")
-                    log_action(mt, key, primary_id, cid, "SKIPPED_MISSING", msg)
-                    add_manual_review_row(
-                        group_type=mt,
-                        group_key=key,
-                        primary_id=primary_id,
-                        secondary_id=cid,
-                        canonical_id="",
-                        error=msg,
+            # Merge the other canonical roots into the primary first, then every CSV ID
+            # that was not already merged as a root. Within a wave the merge calls run
+            # concurrently; results are handled in the original order. An ID listed
+            # twice is merged once, never by two concurrent calls.
+            for wave_ids, is_root in ((canonical_roots, True), (ids_in_group, False)):
+                suffix = "_ROOT" if is_root else ""
+                secondaries = [
+                    sid for sid in dict.fromkeys(wave_ids) if sid != primary_id and sid not in merged_secondaries
+                ]
+                results = merge_all(primary_id, [sid for sid in secondaries if sid in details])
+                for sid in secondaries:
+                    if sid not in details:
+                        ok, info_str = False, ""
+                        msg = "no details returned by HubSpot"
+                    else:
+                        ok, info_str = next(results)
+                        msg = "HubSpot returned not found" if not ok and info_str == "MISSING" else ""
+                    if msg:
+                        print(f"    SKIPPED_MISSING{suffix}: {sid} ({msg})")
+                        log_action(mt, key, primary_id, sid, f"SKIPPED_MISSING{suffix}", msg)
+                        add_manual_review_row(
+                            group_type=mt,
+                            group_key=key,
+                            primary_id=primary_id,
+                            secondary_id=sid,
+                            canonical_id=sid if is_root else "",
+                            error=msg,
+                        )
+                        continue
+                    action = "MERGED" if args.apply and ok else ("DRY_RUN" if not args.apply and ok else "SKIPPED")
+                    print(
+                        f"    {action}: {sid} -> {primary_id}"
+                        f"{'' if info_str in ('MERGED', 'DRY_RUN', 'SAME_ID') else ' | ' + info_str}"
                     )
-                    continue
-                action = "MERGED" if args.apply and ok else ("DRY_RUN" if not args.apply and ok else "SKIPPED")
-                print(
-                    f"    {action}: {cid} -> {primary_id}"
-                    f"{'' if info_str in ('MERGED', 'DRY_RUN', 'SAME_ID') else ' | ' + info_str}"
-                )
-                log_action(mt, key, primary_id, cid, action, info_str)
-                if not ok and info_str.startswith("error 400") and "forward reference to" in info_str:
-                    collect_forward_reference(mt, key, primary_id, cid, info_str)
-                if ok:
-                    total_merges_planned += 1
-                    if args.apply and info_str == "MERGED":
-                        total_merges_applied += 1
+                    log_action(mt, key, primary_id, sid, action, info_str)
+                    if not ok and info_str.startswith("error 400"):
+                        collect_forward_reference(mt, key, primary_id, sid, info_str)
+                    if ok:
+                        merged_secondaries.add(sid)
+                        total_merges_planned += 1
+                        if args.apply and info_str == "MERGED":
+                            total_merges_applied += 1
+                # merges cannot be undone: get their record to disk before the next wave
+                log_f.flush()
 
             print()
 
@@ -0,0 +1,120 @@
+# Helpers shared by the duplicate finder and the merge scripts.
+import random
+import threading
+import time
+from collections import defaultdict
+from typing import Any
+
+import requests
+
+RATE_LIMIT = 9  # requests per second until HubSpot's X-HubSpot-RateLimit-* headers say otherwise
+MAX_RETRIES = 8  # attempts per request while HubSpot answers 429
+
+
+class UnionFind:
+    """Union-find (disjoint set) over company ids or names, with path compression and union by size."""
+
+    def __init__(self):
+        self.parent: dict[str, str] = {}
+        self.size: dict[str, int] = {}
+
+    def find(self, x: str) -> str:
+        parent = self.parent
+        root = parent.setdefault(x, x)
+        while root != parent[root]:
+            root = parent[root]
+        while x != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    def union(self, a: str, b: str) -> None:
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return
+        if self.size.get(ra, 1) < self.size.get(rb, 1):
+            ra, rb = rb, ra
+        self.parent[rb] = ra
+        self.size[ra] = self.size.get(ra, 1) + self.size.get(rb, 1)
+
+    def groups(self) -> dict[str, list[str]]:
+        """Members of every set, keyed by root, in the order they were first seen."""
+        groups: dict[str, list[str]] = defaultdict(list)
+        for x in list(self.parent):
+            groups[self.find(x)].append(x)
+        return groups
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by all requests of this process.
+    acquire() blocks until a request may be sent without exceeding `rate` per second;
+    update() follows the limits HubSpot reports in its rate limit response headers.
+    """
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def update(self, headers) -> None:
+        """Pace at X-HubSpot-RateLimit-Max per interval and never exceed the Remaining count."""
+        try:
+            limit = int(headers["X-HubSpot-RateLimit-Max"])
+            interval_ms = int(headers["X-HubSpot-RateLimit-Interval-Milliseconds"])
+            remaining = int(headers["X-HubSpot-RateLimit-Remaining"])
+        except (KeyError, ValueError):
+            return
+        if limit <= 0 or interval_ms <= 0:
+            return
+        with self.lock:
+            self.rate = limit * 1000 / interval_ms
+            self.tokens = min(self.tokens, remaining)
+
+    def pause(self, seconds: float) -> None:
+        """Drain the bucket so that no new request is admitted for `seconds`."""
+        with self.lock:
+            self.tokens = min(self.tokens, 1 - seconds * self.rate)
+            self.updated = time.monotonic()
+
+
+RATE_LIMITER = TokenBucket(RATE_LIMIT)
+
+
+def hubspot_request(
+    session: requests.Session, method: str, url: str, **kwargs: Any
+) -> requests.Response:
+    """
+    Send a request paced by RATE_LIMITER. A 429 is retried after Retry-After,
+    or after an exponential backoff with jitter, while all other threads are
+    held back too. HubSpot rejects a rate limited merge before applying it,
+    so merges are retried as well.
+    """
+    for attempt in range(MAX_RETRIES):
+        RATE_LIMITER.acquire()
+        resp = session.request(method, url, **kwargs)
+        RATE_LIMITER.update(resp.headers)
+        if resp.status_code != 429:
+            return resp
+
+        retry_after = resp.headers.get("Retry-After")
+        try:
+            sleep_for = float(retry_after) if retry_after else min(30.0, 0.5 * 2 ** attempt) + random.uniform(0, 0.5)
+        except ValueError:
+            sleep_for = min(30.0, 0.5 * 2 ** attempt) + random.uniform(0, 0.5)
+        print(f"Rate limited (429). Sleeping {sleep_for:.1f} seconds...")
+        RATE_LIMITER.pause(sleep_for)
+        time.sleep(sleep_for)
+    return resp
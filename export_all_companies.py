@@ -1,74 +1,125 @@
 #!/usr/bin/env python
 import argparse
 import csv
+import itertools
 import os
 import sys
 import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from typing import Dict, Any, List, Tuple, Optional
+from operator import itemgetter
+from typing import Dict, Any, Iterable, Iterator, List, Set, Tuple, Optional
+from urllib.parse import quote, urlencode
 
+import orjson
 import requests
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from dedup_utils import hubspot_request
+from merge_by_name import CANONICAL_CACHE_PATH, load_canonical_cache, save_canonical_cache
 
 # Load .env
 load_dotenv()
 
 HUBSPOT_TOKEN = os.getenv("HUBSPOT_TOKEN")
 HUBSPOT_BASE = "https://api.hubapi.com"
-
-
-def get_session_and_headers() -> Tuple[requests.Session, Dict[str, str]]:
+BATCH_SIZE = 100  # max inputs per batch read
+MAX_WORKERS = 8  # concurrent batch reads while resolving canonical chains
+POOL_SIZE = 16  # keep-alive connections per host
+TIMEOUT = 30
+WRITE_BUFFER = 1 << 20  # output CSV write buffer, bytes
+
+# Compact per-company record kept after each fetched page (canonical_id is stripped)
+Company = namedtuple("Company", "id name domain createdate canonical_id")
+
+# Output CSV columns, in the order iter_output_rows yields them
+OUTPUT_FIELDS = [
+    "id",
+    "name",
+    "domain",
+    "createdate",
+    "hs_canonical_object_id",
+    "resolved_canonical_id",
+    "is_canonical",
+]
+
+
+def get_session() -> requests.Session:
+    """
+    Session shared by every request of the export: keep-alive connections are
+    pooled, auth headers are set once, and connection errors / 5xx responses
+    are retried with backoff. 429 is handled by hubspot_request, which honors Retry-After.
+    """
     if not HUBSPOT_TOKEN:
         print("ERROR: HUBSPOT_TOKEN is not set in environment (.env).")
         sys.exit(1)
 
+    retry = Retry(
+        total=5,
+        backoff_factor=0.3,
+        status_forcelist=[500, 502, 503, 504],
+        allowed_methods=["GET", "POST"],  # the batch read POST is read-only
+        raise_on_status=False,
+    )
     session = requests.Session()
-    headers = {
-        "Authorization": f"Bearer {HUBSPOT_TOKEN}",
-        "Content-Type": "application/json",
-    }
-    return session, headers
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE, max_retries=retry))
+    session.headers.update(
+        {
+            "Authorization": f"Bearer {HUBSPOT_TOKEN}",
+            "Content-Type": "application/json",
+            "Accept-Encoding": "gzip, deflate",
+        }
+    )
+    return session
 
 
 def fetch_all_companies(
     session: requests.Session,
-    headers: Dict[str, str],
     properties: List[str],
     limit: int,
     max_count: Optional[int],
-) -> List[Dict[str, Any]]:
+) -> List[Company]:
     """
     Fetch companies from HubSpot up to max_count if provided.
+    Each page is projected to Company tuples right away; the rest of the
+    HubSpot objects (timestamps, archived flag, ...) is not kept.
     """
-    url = f"{HUBSPOT_BASE}/crm/v3/objects/companies"
-    params: Dict[str, Any] = {
-        "limit": limit,
-        "archived": "false",
-        "properties": ",".join(properties),
-    }
-
-    results: List[Dict[str, Any]] = []
+    # the query string only changes in its paging cursor, so it is encoded once
+    base_url = f"{HUBSPOT_BASE}/crm/v3/objects/companies?" + urlencode(
+        {
+            "limit": limit,
+            "archived": "false",
+            "properties": ",".join(properties),
+        }
+    )
+
+    results: List[Company] = []
     after: Optional[str] = None
 
     while True:
-        if after is not None:
-            params["after"] = after
-
-        resp = session.get(url, headers=headers, params=params)
-
-        if resp.status_code == 429:
-            retry_after = int(resp.headers.get("Retry-After", "3"))
-            print(f"Rate limited (429). Sleeping {retry_after} seconds...")
-            time.sleep(retry_after)
-            continue
+        url = base_url if after is None else f"{base_url}&after={quote(str(after), safe='')}"
+        resp = hubspot_request(session, "GET", url, timeout=TIMEOUT)
 
         if resp.status_code != 200:
             print(f"ERROR: fetch_all_companies HTTP {resp.status_code}: {resp.text}")
             sys.exit(1)
 
-        data = resp.json()
-        batch = data.get("results", [])
-        results.extend(batch)
+        data = orjson.loads(resp.content)
+        for obj in data.get("results", []):
+            props = obj.get("properties", {}) or {}
+            results.append(
+                Company(
+                    obj.get("id"),
+                    props.get("name") or "",
+                    props.get("domain") or "",
+                    props.get("createdate") or "",
+                    # many merged companies share a canonical id
+                    sys.intern((props.get("hs_canonical_object_id") or "").strip()),
+                )
+            )
 
         if max_count is not None and len(results) >= max_count:
             results = results[:max_count]
@@ -85,151 +136,167 @@ def fetch_all_companies(
     return results
 
 
-def fetch_company(
+def fetch_canonical_parents(
     session: requests.Session,
-    headers: Dict[str, str],
-    company_id: str,
-    props: Optional[List[str]] = None,
-) -> Optional[Dict[str, Any]]:
-    if props is None:
-        props = ["hs_canonical_object_id", "createdate", "name", "domain"]
+    company_ids: List[str],
+) -> Dict[str, Optional[str]]:
+    """
+    Read hs_canonical_object_id for the given companies with the batch endpoint
+    (BATCH_SIZE ids per request, up to MAX_WORKERS requests in flight).
+    Returns id -> stripped canonical id ("" if unset, None if HubSpot does not
+    return the company: deleted, archived). A failed request exits, like
+    merge_by_name.batch_fetch_companies: a missing hop would end chains early
+    and write wrong resolved_canonical_ids (and cache them).
+    """
+    url = f"{HUBSPOT_BASE}/crm/v3/objects/companies/batch/read"
 
-    url = f"{HUBSPOT_BASE}/crm/v3/objects/companies/{company_id}"
-    params = {"properties": ",".join(props), "archived": "false"}
-    resp = session.get(url, headers=headers, params=params)
+    def read_chunk(chunk: List[str]) -> List[Dict[str, Any]]:
+        payload = {
+            "properties": ["hs_canonical_object_id"],
+            "inputs": [{"id": cid} for cid in chunk],
+        }
+        resp = hubspot_request(
+            session, "POST", url, params={"archived": "false"}, json=payload, timeout=TIMEOUT
+        )
 
-    if resp.status_code == 404:
-        return None
-    if resp.status_code != 200:
-        print(f"WARNING: fetch_company({company_id}) HTTP {resp.status_code}: {resp.text}")
-        return None
+        # 207 = some of the ids were not found; the rest are still in results
+        if resp.status_code not in (200, 207):
+            print(f"ERROR: batch read of {len(chunk)} companies HTTP {resp.status_code}: {resp.text}")
+            sys.exit(1)
+        return orjson.loads(resp.content).get("results", [])
 
-    return resp.json()
+    chunks = [company_ids[i:i + BATCH_SIZE] for i in range(0, len(company_ids), BATCH_SIZE)]
+    if len(chunks) > 1:
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            chunk_results = list(executor.map(read_chunk, chunks))
+    else:
+        chunk_results = [read_chunk(chunk) for chunk in chunks]
+
+    parents: Dict[str, Optional[str]] = {}
+    for chunk, results in zip(chunks, chunk_results):
+        parents.update(dict.fromkeys(chunk))
+        for obj in results:
+            props = obj.get("properties", {}) or {}
+            parents[obj["id"]] = (props.get("hs_canonical_object_id") or "").strip()
+    return parents
 
 
-def resolve_canonical_id(
+def resolve_canonical_ids_bulk(
     session: requests.Session,
-    headers: Dict[str, str],
-    cache: Dict[str, str],
-    company_id: str,
-    initial_properties: Optional[Dict[str, Any]] = None,
+    companies: List[Company],
+    cache: Optional[Dict[str, Tuple[Optional[str], float]]] = None,
     max_depth: int = 10,
-) -> str:
+) -> Dict[str, str]:
     """
-    Resolve the final canonical company ID for the given company_id
-    by following hs_canonical_object_id until it is empty or stable.
+    Resolve the final canonical company ID for every company by following
+    hs_canonical_object_id until it is empty or stable (at most max_depth hops).
+
+    Chains are walked over an in-memory id -> canonical id map built from the
+    exported companies. Only targets outside the export (archived, past
+    --max-count) are read from HubSpot, level by level with the batch endpoint,
+    unless they are in cache; reads are added to cache. A target HubSpot does
+    not return ends the chain at that target.
     """
-    if company_id in cache:
-        return cache[company_id]
-
-    current_id = company_id
-    depth = 0
-    props = initial_properties.copy() if initial_properties else None
-
-    while depth < max_depth:
-        depth += 1
-
-        if props is None:
-            obj = fetch_company(session, headers, current_id, props=["hs_canonical_object_id"])
-            if obj is None:
-                cache[company_id] = current_id
-                return current_id
-            props = obj.get("properties", {}) or {}
-
-        canonical_prop = (props.get("hs_canonical_object_id") or "").strip()
-
-        if not canonical_prop:
-            cache[company_id] = current_id
-            return current_id
-
-        if canonical_prop == current_id:
-            cache[company_id] = current_id
-            return current_id
-
-        current_id = canonical_prop
-        props = None
-
-    cache[company_id] = current_id
-    return current_id
-
-
-def parse_createdate(props: Dict[str, Any]) -> str:
-    raw = props.get("createdate")
+    if cache is None:
+        cache = {}
+    parents: Dict[str, Optional[str]] = {c.id: c.canonical_id for c in companies}
+
+    requested: Set[str] = set(parents)
+    level = {p for p in parents.values() if p and p not in requested}
+    for _ in range(max_depth - 1):
+        if not level:
+            break
+        requested |= level
+        found = {cid: cache[cid][0] for cid in level if cid in cache}
+        fetched = fetch_canonical_parents(session, [cid for cid in level if cid not in found])
+        now = time.time()
+        cache.update((cid, (parent, now)) for cid, parent in fetched.items())
+        found.update(fetched)
+        parents.update(found)
+        level = {p for p in found.values() if p and p not in requested}
+
+    # Path compression: every node on a chain that reached its end is mapped to
+    # (final id, hops to it), so later walks through the same nodes stop there.
+    # The shortcut is only taken while it stays within max_depth, which keeps
+    # cyclic / over-long chains resolving exactly like a plain walk.
+    ends: Dict[str, Tuple[str, int]] = {}
+    resolved: Dict[str, str] = {}
+    for company_id in [c.id for c in companies]:
+        path: List[str] = []
+        current_id = company_id
+        reached_end = True
+        while True:
+            known = ends.get(current_id)
+            if known is not None and len(path) + known[1] <= max_depth:
+                current_id, hops = known[0], len(path) + known[1]
+                break
+            parent = parents.get(current_id)
+            if not parent or parent == current_id:
+                hops = len(path)
+                break
+            if len(path) == max_depth:
+                reached_end = False
+                break
+            path.append(current_id)
+            current_id = parent
+
+        if reached_end:
+            for i, node in enumerate(path):
+                ends[node] = (current_id, hops - i)
+        resolved[company_id] = current_id
+
+    return resolved
+
+
+def parse_createdate(raw: str) -> str:
     if not raw:
         return ""
     try:
-        dt = datetime.fromisoformat(raw.replace("Z", "+00:00"))
+        if raw.endswith("Z"):
+            # HubSpot's usual form is already UTC: parse it naive, no tz round trip
+            return datetime.fromisoformat(raw[:-1]).isoformat() + "+00:00"
+        dt = datetime.fromisoformat(raw)
         return dt.astimezone(timezone.utc).isoformat()
     except Exception:
         return ""
 
 
-def build_output_rows(
+def iter_output_rows(
     session: requests.Session,
-    headers: Dict[str, str],
-    companies: List[Dict[str, Any]],
+    companies: List[Company],
     include_merged_history: bool,
-) -> List[Dict[str, Any]]:
+    cache: Optional[Dict[str, Tuple[Optional[str], float]]] = None,
+) -> Iterator[Tuple[str, ...]]:
     """
-    Build rows for CSV output.
+    Yield rows for CSV output one at a time (tuples in OUTPUT_FIELDS order),
+    so they can be written as they are built.
 
     By default only canonical endpoints are included.
     If include_merged_history is True, all companies are exported.
     """
-    rows: List[Dict[str, Any]] = []
-    canonical_cache: Dict[str, str] = {}
-
-    for obj in companies:
-        cid = obj.get("id")
-        props = obj.get("properties", {}) or {}
+    canonical_ids = resolve_canonical_ids_bulk(session, companies, cache)
 
-        raw_name = props.get("name") or ""
-        raw_domain = props.get("domain") or ""
-        raw_canonical = (props.get("hs_canonical_object_id") or "").strip()
-        created_iso = parse_createdate(props)
-
-        resolved_canonical = resolve_canonical_id(
-            session, headers, canonical_cache, cid, initial_properties=props
-        )
+    for cid, raw_name, raw_domain, raw_created, raw_canonical in companies:
+        resolved_canonical = canonical_ids[cid]
         is_canonical = "1" if resolved_canonical == cid else "0"
 
         if not include_merged_history and is_canonical != "1":
             continue
 
-        row = {
-            "id": cid,
-            "name": raw_name,
-            "domain": raw_domain,
-            "createdate": created_iso,
-            "hs_canonical_object_id": raw_canonical,
-            "resolved_canonical_id": resolved_canonical,
-            "is_canonical": is_canonical,
-        }
-        rows.append(row)
-
-    return rows
-
+        created_iso = parse_createdate(raw_created)
+        yield (cid, raw_name, raw_domain, created_iso, raw_canonical, resolved_canonical, is_canonical)
 
-def write_csv(path: str, rows: List[Dict[str, Any]]) -> None:
-    os.makedirs(os.path.dirname(path), exist_ok=True)
 
-    fieldnames = [
-        "id",
-        "name",
-        "domain",
-        "createdate",
-        "hs_canonical_object_id",
-        "resolved_canonical_id",
-        "is_canonical",
-    ]
+def write_csv(path: str, rows: Iterable[Tuple[str, ...]]) -> None:
+    # zip() advances the counter once per row, so the rows are counted without
+    # leaving writerows' C loop
+    counter = itertools.count()
+    with open(path, "w", encoding="utf-8", newline="", buffering=WRITE_BUFFER) as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(OUTPUT_FIELDS)
+        writer.writerows(map(itemgetter(0), zip(rows, counter)))
 
-    with open(path, "w", encoding="utf-8", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames, delimiter=";")
-        writer.writeheader()
-        for row in rows:
-            writer.writerow(row)
-
-    print(f"Wrote {len(rows)} rows to {path}")
+    print(f"Wrote {next(counter)} rows to {path}")
 
 
 def parse_args() -> argparse.Namespace:
@@ -261,12 +328,21 @@ def parse_args() -> argparse.Namespace:
         default=100,
         help="API page size (max 100). Default: 100.",
     )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help=(
+            f"Ignore the canonical ids of companies outside the export cached in "
+            f"{CANONICAL_CACHE_PATH} and read them all from HubSpot again. "
+            f"The file is neither read nor written."
+        ),
+    )
     return parser.parse_args()
 
 
 def main() -> None:
     args = parse_args()
-    session, headers = get_session_and_headers()
+    session = get_session()
 
     if args.output:
         out_path = args.output
@@ -274,6 +350,11 @@ def main() -> None:
         ts = datetime.now().strftime("%Y%m%d-%H%M%S")
         out_path = os.path.join("data", f"all_companies_{ts}.csv")
 
+    # a bare file name has no directory to create
+    out_dir = os.path.dirname(out_path)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+
     properties = [
         "name",
         "domain",
@@ -284,21 +365,26 @@ def main() -> None:
     print("Fetching companies from HubSpot...")
     companies = fetch_all_companies(
         session=session,
-        headers=headers,
         properties=properties,
         limit=args.limit,
         max_count=args.max_count,
     )
 
+    # --no-cache leaves the shared file alone: the merge scripts rely on it too
+    cache = {} if args.no_cache else load_canonical_cache(CANONICAL_CACHE_PATH)
+
     print("Building output rows with canonical information...")
-    rows = build_output_rows(
+    rows = iter_output_rows(
         session=session,
-        headers=headers,
         companies=companies,
         include_merged_history=args.include_merged_history,
+        cache=cache,
     )
 
+    # rows are generated while the file is written
     write_csv(out_path, rows)
+    if not args.no_cache:
+        save_canonical_cache(CANONICAL_CACHE_PATH, cache)
 
 
 if __name__ == "__main__":
@@ -5,16 +5,23 @@
 # (for example company_merge.py, manual_review_merge.py and merge_fuzzy_ids.py).
 # In the current workflow it is not meant to be run directly as a standalone CLI.
 import argparse
+import atexit
 import csv
 import os
 import re
 import sys
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timezone
-from typing import Dict, Any, List, Tuple, Set, Optional
+from typing import Dict, Any, Callable, Iterable, List, Tuple, Set, Optional
 
+import orjson
 import requests
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from dedup_utils import hubspot_request
 
 # Load .env file
 load_dotenv()
@@ -23,16 +30,138 @@ load_dotenv()
 HUBSPOT_TOKEN = os.getenv("HUBSPOT_TOKEN")
 HUBSPOT_BASE = "https://api.hubapi.com"
 
+# Concurrent HubSpot calls (batch reads, merges) per phase
+MAX_WORKERS = 8
+POOL_SIZE = 16  # keep-alive connections per host
+# Max ids per batch read request
+BATCH_SIZE = 100
+
+# HubSpot merge error naming the canonical the merge has to go through
+FORWARD_REF_RE = re.compile(r"forward reference to (\d+)")
+
+# Sorts companies without a (valid) createdate last
+MAX_CREATEDATE = datetime.max.replace(tzinfo=timezone.utc)
+
+# Canonical-chain hops read from HubSpot, shared with export_all_companies.py
+CANONICAL_CACHE_PATH = os.path.join("data", ".canonical_cache.json")
+CACHE_TTL = 7 * 24 * 3600  # seconds a cached hs_canonical_object_id is trusted
+
+
+def load_canonical_cache(path: str) -> Dict[str, Tuple[Optional[str], float]]:
+    """
+    Load id -> (canonical id, fetched at) entries saved by a previous run,
+    dropping entries older than CACHE_TTL. A missing or unreadable file gives an empty cache.
+    """
+    if not os.path.isfile(path):
+        return {}
+    try:
+        with open(path, "rb") as f:
+            entries = orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError):
+        print(f"WARNING: ignoring unreadable canonical cache {path}")
+        return {}
+    oldest = time.time() - CACHE_TTL
+    return {cid: (parent, ts) for cid, (parent, ts) in entries.items() if ts >= oldest}
+
+
+def save_canonical_cache(path: str, cache: Dict[str, Tuple[Optional[str], float]]) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(orjson.dumps(cache))
+    os.replace(tmp_path, path)
+
+
+class CanonicalCache:
+    """
+    Persistent company ID -> hs_canonical_object_id map for canonical-chain hops.
+
+    Entries are (canonical id, fetched at) pairs, "" meaning the company is its
+    own canonical and None that HubSpot did not return it. Read and written
+    with load_canonical_cache / save_canonical_cache, like the export does.
+    """
+
+    def __init__(self, path: str = CANONICAL_CACHE_PATH) -> None:
+        self.path = path
+        self.entries: Dict[str, Tuple[Optional[str], float]] = {}
+        self.loaded = False
+        self.dirty = False
+
+    def load(self) -> None:
+        """
+        Read entries saved by a previous run and save them back when the
+        interpreter exits. Only the first call does anything.
+        """
+        if self.loaded:
+            return
+        self.loaded = True
+        atexit.register(self.save)
+        self.entries.update(load_canonical_cache(self.path))
+
+    def save(self) -> None:
+        if not self.dirty:
+            return
+        save_canonical_cache(self.path, self.entries)
+        self.dirty = False
+
+    def __contains__(self, company_id: str) -> bool:
+        return company_id in self.entries
+
+    def get_properties(self, company_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Cached entry as a properties dict (None if HubSpot did not return it).
+        """
+        parent = self.entries[company_id][0]
+        return None if parent is None else {"hs_canonical_object_id": parent}
+
+    def store(self, company_id: str, props: Optional[Dict[str, Any]]) -> None:
+        parent = None if props is None else (props.get("hs_canonical_object_id") or "").strip()
+        self.entries[company_id] = (parent, time.time())
+        self.dirty = True
+
+    def invalidate(self, company_id: str) -> None:
+        """
+        Forget a company, e.g. after it was merged into another one.
+        """
+        if self.entries.pop(company_id, None) is not None:
+            self.dirty = True
+
+
+CANONICAL_CACHE = CanonicalCache()
+
 
 def get_session_and_headers() -> Tuple[requests.Session, Dict[str, str]]:
     """
     Initialize a requests session and build default headers for HubSpot API.
+
+    Keep-alive connections are pooled for the concurrent phases, and
+    connection errors / 5xx responses are retried with backoff. Searches and
+    batch reads (POST, but read-only) are retried too; merges are not, since
+    a merge that failed with 5xx may still have been applied.
     """
     if not HUBSPOT_TOKEN:
         print("ERROR: HUBSPOT_TOKEN is not set in environment (.env).")
         sys.exit(1)
 
+    CANONICAL_CACHE.load()
+
+    retry = Retry(
+        total=5,
+        backoff_factor=0.3,
+        status_forcelist=[500, 502, 503, 504],
+        allowed_methods=["GET", "POST"],
+        raise_on_status=False,
+    )
+    # Merges are only retried on connection errors (the request was never sent)
+    merge_retry = Retry(total=5, read=0, backoff_factor=0.3)
     session = requests.Session()
+    session.mount(
+        "https://", HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE, max_retries=retry)
+    )
+    session.mount(
+        f"{HUBSPOT_BASE}/crm/v3/objects/companies/merge",
+        HTTPAdapter(pool_maxsize=POOL_SIZE, max_retries=merge_retry),
+    )
     headers = {
         "Authorization": f"Bearer {HUBSPOT_TOKEN}",
         "Content-Type": "application/json",
@@ -72,7 +201,7 @@ def hubspot_company_search(
     while True:
         if after is not None:
             body["after"] = after
-        resp = session.post(url, headers=headers, json=body)
+        resp = hubspot_request(session, "POST", url, headers=headers, json=body)
         if resp.status_code != 200:
             print(
                 f"ERROR: hubspot_company_search({operator}) HTTP {resp.status_code}: {resp.text}"
@@ -119,12 +248,12 @@ def parse_createdate_from_properties(props: Dict[str, Any]) -> datetime:
     """
     raw = props.get("createdate")
     if not raw:
-        return datetime.max.replace(tzinfo=timezone.utc)
+        return MAX_CREATEDATE
     try:
         dt = datetime.fromisoformat(raw.replace("Z", "+00:00"))
         return dt.astimezone(timezone.utc)
     except Exception:
-        return datetime.max.replace(tzinfo=timezone.utc)
+        return MAX_CREATEDATE
 
 
 def parse_createdate(obj: Dict[str, Any]) -> datetime:
@@ -135,6 +264,14 @@ def parse_createdate(obj: Dict[str, Any]) -> datetime:
     return parse_createdate_from_properties(props)
 
 
+def display_name(obj: Dict[str, Any]) -> str:
+    """
+    Company name for log lines, falling back to the company ID.
+    """
+    props = obj.get("properties", {}) or {}
+    return props.get("name") or obj["id"]
+
+
 def fetch_company(
     session: requests.Session,
     headers: Dict[str, str],
@@ -156,7 +293,7 @@ def fetch_company(
         "properties": ",".join(props),
         "archived": "false",
     }
-    resp = session.get(url, headers=headers, params=params)
+    resp = hubspot_request(session, "GET", url, headers=headers, params=params)
     if resp.status_code == 404:
         return None
     if resp.status_code != 200:
@@ -165,6 +302,98 @@ def fetch_company(
     return resp.json()
 
 
+def batch_fetch_companies(
+    session: requests.Session,
+    headers: Dict[str, str],
+    ids: List[str],
+    props: List[str],
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Fetch many companies by ID with the batch read endpoint.
+
+    Returns a dict of company ID -> JSON object in the order of ids.
+    IDs that were not found are left out. A failed request exits, like
+    hubspot_company_search: a group read with companies missing could
+    pick the wrong primary.
+    """
+    url = f"{HUBSPOT_BASE}/crm/v3/objects/companies/batch/read"
+    chunks = [ids[i:i + BATCH_SIZE] for i in range(0, len(ids), BATCH_SIZE)]
+
+    def read_chunk(chunk: List[str]) -> List[Dict[str, Any]]:
+        body = {"inputs": [{"id": cid} for cid in chunk], "properties": props}
+        resp = hubspot_request(
+            session, "POST", url, headers=headers, params={"archived": "false"}, json=body
+        )
+        # 207 = some of the ids were not found, the rest are in results
+        if resp.status_code not in (200, 207):
+            print(f"ERROR: batch_fetch_companies HTTP {resp.status_code}: {resp.text}")
+            sys.exit(1)
+        return orjson.loads(resp.content).get("results", [])
+
+    found: Dict[str, Dict[str, Any]] = {}
+    for results in parallel_map(read_chunk, chunks):
+        for obj in results:
+            found[obj["id"]] = obj
+    return {cid: found[cid] for cid in ids if cid in found}
+
+
+def prefetch_canonical_hops(
+    session: requests.Session,
+    headers: Dict[str, str],
+    objs: Iterable[Dict[str, Any]],
+    max_depth: int = 10,
+) -> Dict[str, Optional[Dict[str, Any]]]:
+    """
+    Batch read the hs_canonical_object_id chains of the given companies.
+    Hops found in CANONICAL_CACHE are not read again; read hops are added to it.
+
+    Returns company ID -> properties for the companies themselves and every
+    company reachable along their chains (None if it was not found), for use
+    as resolve_canonical_id(..., known=...).
+    """
+    known: Dict[str, Optional[Dict[str, Any]]] = {
+        obj["id"]: obj.get("properties", {}) or {} for obj in objs
+    }
+    frontier = list(known.items())
+
+    for _ in range(max_depth - 1):
+        targets: List[str] = []
+        for cid, props in frontier:
+            canonical_prop = ((props or {}).get("hs_canonical_object_id") or "").strip()
+            if canonical_prop and canonical_prop != cid and canonical_prop not in known:
+                known[canonical_prop] = None
+                targets.append(canonical_prop)
+        if not targets:
+            break
+        to_fetch = [cid for cid in targets if cid not in CANONICAL_CACHE]
+        fetched = batch_fetch_companies(
+            session, headers, to_fetch, ["hs_canonical_object_id", "createdate"]
+        )
+        for cid in targets:
+            if cid in fetched:
+                known[cid] = fetched[cid].get("properties", {}) or {}
+                CANONICAL_CACHE.store(cid, known[cid])
+            elif cid in CANONICAL_CACHE:
+                known[cid] = CANONICAL_CACHE.get_properties(cid)
+        frontier = [(cid, known[cid]) for cid in targets if known[cid] is not None]
+
+    return known
+
+
+def parallel_map(fn: Callable[[Any], Any], items: Iterable[Any]) -> List[Any]:
+    """
+    Apply fn to every item using a thread pool, returning results in input order.
+
+    Used for the read-only phases (fetching companies, walking canonical
+    chains) so their HubSpot round-trips overlap instead of adding up.
+    """
+    items = list(items)
+    if len(items) <= 1:
+        return [fn(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(items))) as pool:
+        return list(pool.map(fn, items))
+
+
 def resolve_canonical_id(
     session: requests.Session,
     headers: Dict[str, str],
@@ -172,30 +401,48 @@ def resolve_canonical_id(
     company_id: str,
     initial_properties: Optional[Dict[str, Any]] = None,
     max_depth: int = 10,
+    known: Optional[Dict[str, Optional[Dict[str, Any]]]] = None,
 ) -> str:
     """
     Resolve the final canonical company ID for a given company ID.
 
     Follows hs_canonical_object_id chain until it is empty or stable.
     Uses a small depth limit to avoid accidental infinite loops.
+    Hops found in known (see prefetch_canonical_hops) or CANONICAL_CACHE are
+    not fetched again; fetched hops are added to CANONICAL_CACHE.
     """
     if company_id in cache:
         return cache[company_id]
 
+    # Most companies are their own canonical: no pointer, nothing to follow
+    if initial_properties:
+        canonical_prop = (initial_properties.get("hs_canonical_object_id") or "").strip()
+        if not canonical_prop or canonical_prop == company_id:
+            cache[company_id] = company_id
+            return company_id
+
     current_id = company_id
     depth = 0
-    props = initial_properties.copy() if initial_properties else None
+    # Only read, never modified, so no copy is needed
+    props = initial_properties or None
 
     while depth < max_depth:
         depth += 1
         if props is None:
-            obj = fetch_company(
-                session, headers, current_id, props=["hs_canonical_object_id", "createdate"]
-            )
-            if obj is None:
+            if known is not None and current_id in known:
+                props = known[current_id]
+            elif current_id in CANONICAL_CACHE:
+                props = CANONICAL_CACHE.get_properties(current_id)
+            else:
+                obj = fetch_company(
+                    session, headers, current_id, props=["hs_canonical_object_id", "createdate"]
+                )
+                if obj is not None:
+                    props = obj.get("properties", {}) or {}
+                    CANONICAL_CACHE.store(current_id, props)
+            if props is None:
                 cache[company_id] = current_id
                 return current_id
-            props = obj.get("properties", {}) or {}
 
         canonical_prop = (props.get("hs_canonical_object_id") or "").strip()
 
@@ -229,22 +476,78 @@ def merge_pair(
     """
     url = f"{HUBSPOT_BASE}/crm/v3/objects/companies/merge"
     payload = {"primaryObjectId": primary_id, "objectIdToMerge": secondary_id}
-    resp = session.post(url, headers=headers, json=payload)
+    resp = hubspot_request(session, "POST", url, headers=headers, json=payload)
     if resp.status_code == 200:
+        # The secondary now points to the primary, its cached hop is stale
+        CANONICAL_CACHE.invalidate(secondary_id)
         return True, "MERGED"
     return False, f"HTTP {resp.status_code}: {resp.text}"
 
 
+def submit_merge_wave(
+    pool: ThreadPoolExecutor,
+    session: requests.Session,
+    headers: Dict[str, str],
+    primary_id: str,
+    ids: List[str],
+    company_objs: Dict[str, Dict[str, Any]],
+) -> Dict[str, Tuple[str, "Future[Tuple[bool, str]]"]]:
+    """
+    Start merging ids (in order) into primary_id concurrently.
+
+    Returns secondary ID -> (primary ID used, future of merge result).
+
+    Callers only start a wave once a merge into primary_id has succeeded, so
+    the primary itself is known to be canonical. The wave stops after the
+    first company whose hs_canonical_object_id points elsewhere: its merge may
+    report a forward reference and switch the primary, so the companies after
+    it must wait for that result.
+    """
+    wave: Dict[str, Tuple[str, "Future[Tuple[bool, str]]"]] = {}
+    for cid in ids:
+        if cid == primary_id or cid in wave:
+            continue
+        wave[cid] = (
+            primary_id,
+            pool.submit(merge_pair, session, headers, primary_id, cid),
+        )
+        props = company_objs[cid].get("properties", {}) or {}
+        canonical_prop = (props.get("hs_canonical_object_id") or "").strip()
+        if canonical_prop and canonical_prop != cid:
+            break
+    return wave
+
+
+def forget_merged(
+    secondary_id: str,
+    canonical_cache: Dict[str, str],
+    prefetched: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> None:
+    """
+    Drop what a run has cached about a company that was just merged away:
+    its prefetched object and every canonical id resolved to or from it.
+    Later groups then read it from HubSpot again.
+    """
+    stale = [cid for cid, canon in canonical_cache.items() if secondary_id in (cid, canon)]
+    for cid in stale:
+        del canonical_cache[cid]
+    if prefetched is not None:
+        prefetched.pop(secondary_id, None)
+
+
 def merge_companies_for_name(
     session: requests.Session,
     headers: Dict[str, str],
     name: str,
     dry_run: bool,
-    sleep_seconds: float = 0.3,
+    canonical_cache: Optional[Dict[str, str]] = None,
 ) -> Tuple[int, int, bool, bool, bool, List[str]]:
     """
     Merge all companies with the given name into a single canonical.
 
+    Requests are paced by dedup_utils.RATE_LIMITER. Pass the same canonical_cache to
+    several calls to resolve shared canonical chains once.
+
     Returns:
       success_count
       failure_count
@@ -258,6 +561,8 @@ def merge_companies_for_name(
     fuzzy_candidates_found = False
     fuzzy_merge_performed = False
     merged_pairs: List[str] = []
+    # Parsed createdate per company ID, each company is parsed once
+    created_at: Dict[str, datetime] = {}
 
     print(f"\n=== Name: {name} ===")
 
@@ -277,7 +582,7 @@ def merge_companies_for_name(
             cid = c["id"]
             props = c.get("properties", {}) or {}
             cname = props.get("name") or ""
-            created = parse_createdate(c)
+            created = created_at[cid] = parse_createdate(c)
             print(f"    - ID {cid}, name '{cname}', created {created.isoformat()}")
 
         if dry_run:
@@ -306,22 +611,21 @@ def merge_companies_for_name(
 
     print(f"  Found {len(companies)} companies with this name.")
 
-    # Build a mapping for easy name lookup
     company_objs: Dict[str, Dict[str, Any]] = {c["id"]: c for c in companies}
+    for cid, obj in company_objs.items():
+        if cid not in created_at:
+            created_at[cid] = parse_createdate(obj)
 
-    def company_name(company_id: str) -> str:
-        obj = company_objs.get(company_id)
-        if not obj:
-            return company_id
-        props = obj.get("properties", {}) or {}
-        n = props.get("name") or ""
-        return n if n else company_id
+    names: Dict[str, str] = {cid: display_name(obj) for cid, obj in company_objs.items()}
 
     # Resolve canonical IDs
-    canonical_cache: Dict[str, str] = {}
-    all_ids: List[str] = []
+    if canonical_cache is None:
+        canonical_cache = {}
     canonical_ids: Set[str] = set()
 
+    all_ids: List[str] = []
+    known = prefetch_canonical_hops(session, headers, companies)
+
     for c in companies:
         cid = c["id"]
         props = c.get("properties", {}) or {}
@@ -332,9 +636,10 @@ def merge_companies_for_name(
             canonical_cache,
             cid,
             initial_properties=props,
+            known=known,
         )
         canonical_ids.add(canonical_id)
-        print(f"    Company {cid} ('{company_name(cid)}') -> canonical {canonical_id}")
+        print(f"    Company {cid} ('{names.get(cid, cid)}') -> canonical {canonical_id}")
 
     # Determine final primary canonical
     if len(canonical_ids) == 1:
@@ -342,56 +647,96 @@ def merge_companies_for_name(
         print(f"  Single canonical for this name: {final_primary_id}")
     else:
         print(f"  Multiple canonical IDs found for this name: {', '.join(canonical_ids)}")
-        canonical_list: List[Tuple[str, datetime]] = []
+        # Candidates from this group are already in company_objs, read the rest at once
+        missing = [cid for cid in canonical_ids if cid not in company_objs]
+        fetched = batch_fetch_companies(
+            session, headers, missing, ["createdate", "name", "domain"]
+        )
+        company_objs.update(fetched)
+        created_at.update((cid, parse_createdate(obj)) for cid, obj in fetched.items())
+        names.update((cid, display_name(obj)) for cid, obj in fetched.items())
         for canon_id in canonical_ids:
-            obj = fetch_company(
-                session, headers, canon_id, props=["createdate", "name", "domain"]
-            )
-            if obj is None:
-                created = datetime.max.replace(tzinfo=timezone.utc)
-            else:
-                created = parse_createdate(obj)
-                company_objs.setdefault(canon_id, obj)
-            canonical_list.append((canon_id, created))
+            created = created_at.get(canon_id, MAX_CREATEDATE)
             print(f"    Canonical candidate {canon_id}, created {created.isoformat()}")
 
-        canonical_list.sort(key=lambda t: t[1])
-        final_primary_id = canonical_list[0][0]
+        final_primary_id = min(
+            canonical_ids, key=lambda cid: created_at.get(cid, MAX_CREATEDATE)
+        )
         print(f"  Selected final primary canonical ID {final_primary_id} (oldest createdate).")
 
     print("  All candidate companies for this name:")
-    for cid, obj in company_objs.items():
-        created = parse_createdate(obj)
-        print(f"    - ID {cid}, name '{company_name(cid)}', created {created.isoformat()}")
+    for cid in company_objs:
+        created = created_at[cid]
+        print(f"    - ID {cid}, name '{names.get(cid, cid)}', created {created.isoformat()}")
 
     if dry_run:
         print("  DRY RUN: no merges executed.")
         return success_count, failure_count, True, fuzzy_candidates_found, fuzzy_merge_performed, merged_pairs
 
-    forward_ref_re = re.compile(r"forward reference to (\d+)")
-
-    # Sort for deterministic behaviour
-    all_ids_sorted = sorted(all_ids)
+    # Sort for deterministic behaviour; a company listed twice is merged once
+    all_ids_sorted = sorted(set(all_ids))
+
+    pending: Dict[str, Tuple[str, "Future[Tuple[bool, str]]"]] = {}
+    primary_confirmed = False
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        for i, cid in enumerate(all_ids_sorted):
+            if cid == final_primary_id:
+                if cid in pending:
+                    # Submitted before the primary was switched to this company
+                    primary_id, future = pending.pop(cid)
+                    ok, info = future.result()
+                    src_name = names.get(cid, cid)
+                    dst_name = names.get(primary_id, primary_id)
+                    print(f"  Merging {cid} ('{src_name}') -> {primary_id} ('{dst_name}')")
+                    if ok:
+                        success_count += 1
+                        forget_merged(cid, canonical_cache)
+                        merged_pairs.append(f"{src_name} -> {dst_name}")
+                        print(f"    RESULT: OK | {info}")
+                    else:
+                        print(f"    RESULT: SKIPPED (now the primary) | {info}")
+                continue
 
-    for cid in all_ids_sorted:
-        if cid == final_primary_id:
-            continue
+            if cid not in pending and primary_confirmed:
+                pending.update(
+                    submit_merge_wave(
+                        pool,
+                        session,
+                        headers,
+                        final_primary_id,
+                        all_ids_sorted[i:],
+                        company_objs,
+                    )
+                )
+            if cid in pending:
+                primary_id, future = pending.pop(cid)
+                ok, info = future.result()
+                if not ok and primary_id != final_primary_id:
+                    # Submitted before the primary was switched, redo against the new one
+                    primary_id = final_primary_id
+                    ok, info = merge_pair(session, headers, primary_id, cid)
+            else:
+                # Until a merge into it succeeds the primary may itself have been
+                # merged away, which would switch it: merge one at a time
+                primary_id = final_primary_id
+                ok, info = merge_pair(session, headers, primary_id, cid)
+            if ok and primary_id == final_primary_id:
+                primary_confirmed = True
 
-        src_name = company_name(cid)
-        dst_name = company_name(final_primary_id)
+            src_name = names.get(cid, cid)
+            dst_name = names.get(primary_id, primary_id)
 
-        print(f"  Merging {cid} ('{src_name}') -> {final_primary_id} ('{dst_name}')")
-        ok, info = merge_pair(session, headers, final_primary_id, cid)
+            print(f"  Merging {cid} ('{src_name}') -> {primary_id} ('{dst_name}')")
 
-        if not ok and "forward reference to" in info:
-            match = forward_ref_re.search(info)
-            if match:
+            match = None if ok else FORWARD_REF_RE.search(info)
+            if match is not None:
                 new_primary = match.group(1)
                 if new_primary != final_primary_id:
                     print(
                         f"    Forward reference detected. Switching primary to {new_primary} and retrying."
                     )
                     final_primary_id = new_primary
+                    primary_confirmed = False
 
                     # Ensure we have data for the new primary for name printing
                     if new_primary not in company_objs:
@@ -403,29 +748,31 @@ def merge_companies_for_name(
                         )
                         if obj is not None:
                             company_objs[new_primary] = obj
+                            names[new_primary] = display_name(obj)
 
-                    dst_name = company_name(final_primary_id)
+                    dst_name = names.get(final_primary_id, final_primary_id)
                     ok_retry, info_retry = merge_pair(
                         session, headers, final_primary_id, cid
                     )
                     if ok_retry:
                         print(f"    RESULT: OK (after primary switch) | {info_retry}")
+                        primary_confirmed = True
                         success_count += 1
+                        forget_merged(cid, canonical_cache)
                         merged_pairs.append(f"{src_name} -> {dst_name}")
                     else:
                         print(f"    RESULT: FAIL (after primary switch) | {info_retry}")
                         failure_count += 1
-                    time.sleep(sleep_seconds)
                     continue
 
-        if ok:
-            success_count += 1
-            merged_pairs.append(f"{src_name} -> {dst_name}")
-        else:
-            failure_count += 1
+            if ok:
+                success_count += 1
+                forget_merged(cid, canonical_cache)
+                merged_pairs.append(f"{src_name} -> {dst_name}")
+            else:
+                failure_count += 1
 
-        print(f"    RESULT: {'OK' if ok else 'FAIL'} | {info}")
-        time.sleep(sleep_seconds)
+            print(f"    RESULT: {'OK' if ok else 'FAIL'} | {info}")
 
     print("  Done.")
     return (
@@ -501,13 +848,19 @@ def merge_companies_for_id_group(
     group_key: str,
     ids: Set[str],
     dry_run: bool,
-    sleep_seconds: float = 0.3,
+    canonical_cache: Optional[Dict[str, str]] = None,
+    prefetched: Optional[Dict[str, Dict[str, Any]]] = None,
 ) -> Tuple[int, int, List[str]]:
     """
     Merge companies for a given group_key using an explicit set of IDs.
 
     Uses the same canonical resolution logic as merge_companies_for_name,
     but does not search by name. Instead it operates directly on known IDs.
+    Requests are paced by dedup_utils.RATE_LIMITER.
+
+    canonical_cache and prefetched (company ID -> object from
+    batch_fetch_companies) can be shared by several calls; companies merged
+    away here are dropped from both.
 
     Returns:
       success_count
@@ -524,15 +877,19 @@ def merge_companies_for_id_group(
         print("  Only one or zero IDs in this group. Nothing to merge.")
         return success_count, failure_count, merged_pairs
 
-    # Fetch all company objects
+    # Fetch all company objects that were not prefetched
+    if prefetched is None:
+        prefetched = {}
+    ids_sorted = sorted(ids)
+    fetched = batch_fetch_companies(
+        session,
+        headers,
+        [cid for cid in ids_sorted if cid not in prefetched],
+        ["hs_canonical_object_id", "createdate", "name", "domain"],
+    )
     company_objs: Dict[str, Dict[str, Any]] = {}
-    for cid in sorted(ids):
-        obj = fetch_company(
-            session,
-            headers,
-            cid,
-            props=["hs_canonical_object_id", "createdate", "name", "domain"],
-        )
+    for cid in ids_sorted:
+        obj = prefetched.get(cid) or fetched.get(cid)
         if obj is None:
             print(f"  WARNING: company {cid} not found, skipping.")
             continue
@@ -542,18 +899,20 @@ def merge_companies_for_id_group(
         print("  Only one valid company found in HubSpot for this group. Nothing to merge.")
         return success_count, failure_count, merged_pairs
 
-    def company_name(company_id: str) -> str:
-        obj = company_objs.get(company_id)
-        if not obj:
-            return company_id
-        props = obj.get("properties", {}) or {}
-        n = props.get("name") or ""
-        return n if n else company_id
+    # Parsed createdate per company ID, each company is parsed once
+    created_at: Dict[str, datetime] = {
+        cid: parse_createdate(obj) for cid, obj in company_objs.items()
+    }
+
+    names: Dict[str, str] = {cid: display_name(obj) for cid, obj in company_objs.items()}
 
     # Resolve canonical IDs
-    canonical_cache: Dict[str, str] = {}
+    if canonical_cache is None:
+        canonical_cache = {}
     canonical_ids: Set[str] = set()
 
+    known = prefetch_canonical_hops(session, headers, company_objs.values())
+
     for cid, obj in company_objs.items():
         props = obj.get("properties", {}) or {}
         canonical_id = resolve_canonical_id(
@@ -562,9 +921,10 @@ def merge_companies_for_id_group(
             canonical_cache,
             cid,
             initial_properties=props,
+            known=known,
         )
         canonical_ids.add(canonical_id)
-        print(f"  Company {cid} ('{company_name(cid)}') -> canonical {canonical_id}")
+        print(f"  Company {cid} ('{names.get(cid, cid)}') -> canonical {canonical_id}")
 
     # Determine final primary canonical
     if len(canonical_ids) == 1:
@@ -572,56 +932,93 @@ def merge_companies_for_id_group(
         print(f"  Single canonical for this group: {final_primary_id}")
     else:
         print(f"  Multiple canonical IDs found for this group: {', '.join(canonical_ids)}")
-        canonical_list: List[Tuple[str, datetime]] = []
+        # Candidates from this group are already in company_objs, read the rest at once
+        missing = [cid for cid in canonical_ids if cid not in company_objs]
+        fetched = batch_fetch_companies(
+            session, headers, missing, ["createdate", "name", "domain"]
+        )
+        company_objs.update(fetched)
+        created_at.update((cid, parse_createdate(obj)) for cid, obj in fetched.items())
+        names.update((cid, display_name(obj)) for cid, obj in fetched.items())
         for canon_id in canonical_ids:
-            obj = fetch_company(
-                session, headers, canon_id, props=["createdate", "name", "domain"]
-            )
-            if obj is None:
-                created = datetime.max.replace(tzinfo=timezone.utc)
-            else:
-                created = parse_createdate(obj)
-                company_objs.setdefault(canon_id, obj)
-            canonical_list.append((canon_id, created))
+            created = created_at.get(canon_id, MAX_CREATEDATE)
             print(f"    Canonical candidate {canon_id}, created {created.isoformat()}")
 
-        canonical_list.sort(key=lambda t: t[1])
-        final_primary_id = canonical_list[0][0]
+        final_primary_id = min(
+            canonical_ids, key=lambda cid: created_at.get(cid, MAX_CREATEDATE)
+        )
         print(
             f"  Selected final primary canonical ID {final_primary_id} (oldest createdate)."
         )
 
     print("  All candidate companies for this group:")
-    for cid, obj in company_objs.items():
-        created = parse_createdate(obj)
+    for cid in company_objs:
+        created = created_at[cid]
         print(
-            f"    - ID {cid}, name '{company_name(cid)}', created {created.isoformat()}"
+            f"    - ID {cid}, name '{names.get(cid, cid)}', created {created.isoformat()}"
         )
 
     if dry_run:
         print("  DRY RUN: no merges executed.")
         return success_count, failure_count, merged_pairs
 
-    forward_ref_re = re.compile(r"forward reference to (\d+)")
-
     # Sort IDs for deterministic behavior
     all_ids_sorted = sorted(company_objs.keys())
 
-    for cid in all_ids_sorted:
-        if cid == final_primary_id:
-            continue
+    pending: Dict[str, Tuple[str, "Future[Tuple[bool, str]]"]] = {}
+    primary_confirmed = False
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        for i, cid in enumerate(all_ids_sorted):
+            if cid == final_primary_id:
+                if cid in pending:
+                    # Submitted before the primary was switched to this company
+                    primary_id, future = pending.pop(cid)
+                    ok, info = future.result()
+                    src_name = names.get(cid, cid)
+                    dst_name = names.get(primary_id, primary_id)
+                    print(f"  Merging {cid} ('{src_name}') -> {primary_id} ('{dst_name}')")
+                    if ok:
+                        success_count += 1
+                        forget_merged(cid, canonical_cache, prefetched)
+                        merged_pairs.append(f"{src_name} -> {dst_name}")
+                        print(f"    RESULT: OK | {info}")
+                    else:
+                        print(f"    RESULT: SKIPPED (now the primary) | {info}")
+                continue
+
+            if cid not in pending and primary_confirmed:
+                pending.update(
+                    submit_merge_wave(
+                        pool,
+                        session,
+                        headers,
+                        final_primary_id,
+                        all_ids_sorted[i:],
+                        company_objs,
+                    )
+                )
+            if cid in pending:
+                primary_id, future = pending.pop(cid)
+                ok, info = future.result()
+                if not ok and primary_id != final_primary_id:
+                    # Submitted before the primary was switched, redo against the new one
+                    primary_id = final_primary_id
+                    ok, info = merge_pair(session, headers, primary_id, cid)
+            else:
+                # Until a merge into it succeeds the primary may itself have been
+                # merged away, which would switch it: merge one at a time
+                primary_id = final_primary_id
+                ok, info = merge_pair(session, headers, primary_id, cid)
+            if ok and primary_id == final_primary_id:
+                primary_confirmed = True
 
-        src_name = company_name(cid)
-        dst_name = company_name(final_primary_id)
+            src_name = names.get(cid, cid)
+            dst_name = names.get(primary_id, primary_id)
 
-        print(
-            f"  Merging {cid} ('{src_name}') -> {final_primary_id} ('{dst_name}')"
-        )
-        ok, info = merge_pair(session, headers, final_primary_id, cid)
+            print(f"  Merging {cid} ('{src_name}') -> {primary_id} ('{dst_name}')")
 
-        if not ok and "forward reference to" in info:
-            match = forward_ref_re.search(info)
-            if match:
+            match = None if ok else FORWARD_REF_RE.search(info)
+            if match is not None:
                 new_primary = match.group(1)
 
                 # Case A: secondary already canonically points to the current primary.
@@ -635,7 +1032,7 @@ def merge_companies_for_id_group(
                     )
                     success_count += 1
                     merged_pairs.append(f"{src_name} -> {dst_name}")
-                    time.sleep(sleep_seconds)
+                    primary_confirmed = True
                     continue
 
                 # Case B: current primary is not canonical and needs to be switched.
@@ -644,6 +1041,7 @@ def merge_companies_for_id_group(
                         f"    Forward reference detected. Switching primary to {new_primary} and retrying."
                     )
                     final_primary_id = new_primary
+                    primary_confirmed = False
 
                     # Ensure we have data for the new primary for name printing
                     if new_primary not in company_objs:
@@ -660,29 +1058,31 @@ def merge_companies_for_id_group(
                         )
                         if obj is not None:
                             company_objs[new_primary] = obj
+                            names[new_primary] = display_name(obj)
 
-                    dst_name = company_name(final_primary_id)
+                    dst_name = names.get(final_primary_id, final_primary_id)
                     ok_retry, info_retry = merge_pair(
                         session, headers, final_primary_id, cid
                     )
                     if ok_retry:
                         print(f"    RESULT: OK (after primary switch) | {info_retry}")
+                        primary_confirmed = True
                         success_count += 1
+                        forget_merged(cid, canonical_cache, prefetched)
                         merged_pairs.append(f"{src_name} -> {dst_name}")
                     else:
                         print(f"    RESULT: FAIL (after primary switch) | {info_retry}")
                         failure_count += 1
-                    time.sleep(sleep_seconds)
                     continue
 
-        if ok:
-            success_count += 1
-            merged_pairs.append(f"{src_name} -> {dst_name}")
-        else:
-            failure_count += 1
+            if ok:
+                success_count += 1
+                forget_merged(cid, canonical_cache, prefetched)
+                merged_pairs.append(f"{src_name} -> {dst_name}")
+            else:
+                failure_count += 1
 
-        print(f"    RESULT: {'OK' if ok else 'FAIL'} | {info}")
-        time.sleep(sleep_seconds)
+            print(f"    RESULT: {'OK' if ok else 'FAIL'} | {info}")
 
     print("  Done.")
     return success_count, failure_count, merged_pairs
@@ -748,6 +1148,8 @@ def main() -> None:
     total_success = 0
     total_failure = 0
     all_merged_pairs: List[str] = []
+    # Shared by all groups / names, so common canonical chains are resolved once
+    canonical_cache: Dict[str, str] = {}
 
     # 1. If file is given, first try ID based groups (manual_review from company_merge or fuzzy)
     if args.file:
@@ -757,10 +1159,24 @@ def main() -> None:
             if dry_run:
                 print("DRY RUN mode. Use --apply to execute merges.")
 
+            # Read every company of the file once; groups share many of them
+            prefetched = batch_fetch_companies(
+                session,
+                headers,
+                sorted(set().union(*id_groups.values())),
+                ["hs_canonical_object_id", "createdate", "name", "domain"],
+            )
+
             for group_key in sorted(id_groups.keys()):
                 ids = id_groups[group_key]
                 s, f, pairs = merge_companies_for_id_group(
-                    session, headers, group_key, ids, dry_run=dry_run
+                    session,
+                    headers,
+                    group_key,
+                    ids,
+                    dry_run=dry_run,
+                    canonical_cache=canonical_cache,
+                    prefetched=prefetched,
                 )
                 total_success += s
                 total_failure += f
@@ -820,7 +1236,7 @@ def main() -> None:
             fuzzy_merged,
             pairs,
         ) = merge_companies_for_name(
-            session, headers, name, dry_run=dry_run
+            session, headers, name, dry_run=dry_run, canonical_cache=canonical_cache
         )
         total_success += s
         total_failure += f
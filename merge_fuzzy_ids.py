@@ -3,7 +3,6 @@ import argparse
 import csv
 import os
 import re
-from collections import defaultdict
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Set, Tuple
@@ -11,6 +10,9 @@ from typing import Dict, List, Set, Tuple
 import requests
 from dotenv import load_dotenv
 
+from dedup_utils import UnionFind
+from merge_by_name import CANONICAL_CACHE
+
 load_dotenv()
 HUBSPOT_TOKEN = os.getenv("HUBSPOT_TOKEN")
 
@@ -29,35 +31,6 @@ def hubspot_request(method: str, path: str, **kwargs) -> requests.Response:
     return resp
 
 
-# ----------------------------------------------------------------------
-# Union-find (disjoint set) for building ID clusters
-# ----------------------------------------------------------------------
-class UnionFind:
-    def __init__(self) -> None:
-        self.parent: Dict[str, str] = {}
-
-    def find(self, x: str) -> str:
-        if x not in self.parent:
-            self.parent[x] = x
-            return x
-        if self.parent[x] != x:
-            self.parent[x] = self.find(self.parent[x])
-        return self.parent[x]
-
-    def union(self, a: str, b: str) -> None:
-        ra = self.find(a)
-        rb = self.find(b)
-        if ra != rb:
-            self.parent[rb] = ra
-
-    def groups(self) -> Dict[str, Set[str]]:
-        groups: Dict[str, Set[str]] = defaultdict(set)
-        for x in list(self.parent.keys()):
-            root = self.find(x)
-            groups[root].add(x)
-        return groups
-
-
 # ----------------------------------------------------------------------
 # Read fuzzy CSV and build clusters
 # ----------------------------------------------------------------------
@@ -81,7 +54,7 @@ def build_clusters_from_fuzzy(fuzzy_path: Path) -> List[Set[str]]:
             uf.union(id1, id2)
 
     groups_dict = uf.groups()
-    clusters = [ids for ids in groups_dict.values() if len(ids) > 1]
+    clusters = [set(ids) for ids in groups_dict.values() if len(ids) > 1]
     return clusters
 
 
@@ -150,6 +123,8 @@ def merge_companies(
     )
 
     if resp.status_code == 200:
+        # The secondary now points to the primary, its cached canonical hop is stale
+        CANONICAL_CACHE.invalidate(secondary_id)
         return True, primary_id, "merged"
 
     # Inspect for forward reference
@@ -342,6 +317,10 @@ def main() -> None:
     if not fuzzy_path.exists():
         raise SystemExit(f"Fuzzy file does not exist: {fuzzy_path}")
 
+    if args.apply:
+        # Merged companies are dropped from data/.canonical_cache.json
+        CANONICAL_CACHE.load()
+
     clusters = build_clusters_from_fuzzy(fuzzy_path)
     print(f"Found {len(clusters)} clusters with size >= 2.")
 
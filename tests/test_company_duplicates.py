@@ -0,0 +1,95 @@
+import unittest
+
+from company_duplicates import Company, build_clusters, fuzzy_name_groups
+from dedup_utils import UnionFind
+
+
+def company(cid: str, norm_name: str) -> Company:
+    return Company(cid, norm_name.title(), "", "", norm_name)
+
+
+class UnionFindTest(unittest.TestCase):
+    def test_groups_in_first_seen_order(self):
+        uf = UnionFind()
+        uf.union("a", "b")
+        uf.union("c", "d")
+        uf.union("b", "d")
+        uf.union("e", "f")
+        groups = list(uf.groups().values())
+        self.assertEqual(groups, [["a", "b", "c", "d"], ["e", "f"]])
+
+    def test_find(self):
+        uf = UnionFind()
+        self.assertEqual(uf.find("x"), "x")
+        for a, b in [("1", "2"), ("3", "4"), ("2", "4"), ("4", "5")]:
+            uf.union(a, b)
+        self.assertEqual(len({uf.find(x) for x in "12345"}), 1)
+        self.assertNotEqual(uf.find("1"), uf.find("x"))
+
+
+class BuildClustersTest(unittest.TestCase):
+    def test_chained_groups_merge(self):
+        dup_groups = {
+            ("company_domain", "a.fi"): [
+                ("12", "a.fi", "A", "", "company_domain", "a.fi"),
+                ("3", "a.fi", "A Oy", "", "company_domain", "a.fi"),
+            ],
+            ("company_name", "a oy"): [
+                ("3", "a.fi", "A Oy", "", "company_name", "a oy"),
+                ("7", "", "A Oy", "", "company_name", "a oy"),
+            ],
+            ("company_domain", "b.fi"): [
+                ("20", "b.fi", "B", "", "company_domain", "b.fi"),
+                ("100", "b.fi", "B Ab", "", "company_domain", "b.fi"),
+            ],
+        }
+        clusters = build_clusters(dup_groups)
+        self.assertEqual(
+            clusters,
+            {
+                ("company_domain,company_name", "3"): [
+                    ("12", "a.fi", "A", "", "company_domain,company_name", "3"),
+                    ("3", "a.fi", "A Oy", "", "company_domain,company_name", "3"),
+                    ("7", "", "A Oy", "", "company_domain,company_name", "3"),
+                ],
+                ("company_domain", "20"): [
+                    ("20", "b.fi", "B", "", "company_domain", "20"),
+                    ("100", "b.fi", "B Ab", "", "company_domain", "20"),
+                ],
+            },
+        )
+
+
+class FuzzyNameGroupsTest(unittest.TestCase):
+    def test_near_duplicates_within_block(self):
+        companies = [
+            company("1", "nordic solutions"),
+            company("2", "nordic solution"),
+            company("3", "nordic solutions"),
+            company("4", "northern lights"),
+        ]
+        groups = fuzzy_name_groups(companies, threshold=88)
+        self.assertEqual(list(groups), ["nordic solution"])
+        self.assertEqual(sorted(c.id for c in groups["nordic solution"]), ["1", "2", "3"])
+
+    def test_pair_across_block_boundary(self):
+        # 11 and 12 characters: blocks (k, 2) and (k, 3)
+        companies = [company("1", "kalastajatk"), company("2", "kalastajatko")]
+        groups = fuzzy_name_groups(companies, threshold=88)
+        self.assertEqual(
+            {key: [c.id for c in members] for key, members in groups.items()},
+            {"kalastajatk": ["1", "2"]},
+        )
+
+    def test_blocks_two_apart_are_not_compared(self):
+        # 11 and 16 characters: blocks (k, 2) and (k, 4)
+        companies = [company("1", "kalastajatk"), company("2", "kalastajatkooooo")]
+        self.assertEqual(fuzzy_name_groups(companies, threshold=50), {})
+
+    def test_different_first_character(self):
+        companies = [company("1", "xnordic"), company("2", "nordic")]
+        self.assertEqual(fuzzy_name_groups(companies, threshold=80), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+
+from company_duplicates_fuzzy import SUFFIX_RE, normalize_name
+
+
+class SuffixReTest(unittest.TestCase):
+    def strip(self, s: str) -> str:
+        m = SUFFIX_RE.search(s)
+        return s[: m.start()] if m else s
+
+    def test_legal_suffixes(self):
+        self.assertEqual(self.strip("acme oy"), "acme")
+        self.assertEqual(self.strip("acme oy ab"), "acme")
+        self.assertEqual(self.strip("acme gmbh"), "acme")
+
+    def test_weak_suffix_before_legal_suffixes(self):
+        self.assertEqual(self.strip("oulun kuivaustekniikka group oy"), "oulun kuivaustekniikka")
+        self.assertEqual(self.strip("acme group"), "acme")
+        self.assertEqual(self.strip("acme group group oy"), "acme")
+
+    def test_legal_suffix_before_weak_suffix_is_kept(self):
+        self.assertEqual(self.strip("acme oy group"), "acme oy")
+
+    def test_whole_tokens_only(self):
+        self.assertEqual(self.strip("groupon"), "groupon")
+        self.assertEqual(self.strip("acme abc"), "acme abc")
+        self.assertEqual(self.strip("kioy"), "kioy")
+        self.assertEqual(self.strip("ikaalinen spa"), "ikaalinen spa")
+        self.assertEqual(self.strip("oy acme"), "oy acme")
+
+    def test_normalize_name(self):
+        self.assertEqual(normalize_name("  Oulun   Kuivaustekniikka   Group Oy  "), "oulun kuivaustekniikka")
+        self.assertEqual(normalize_name(""), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
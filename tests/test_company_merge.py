@@ -0,0 +1,66 @@
+import os
+import tempfile
+import unittest
+
+from company_merge import make_group_key, normalize_name, sniff_delimiter
+
+
+class NormalizeNameTest(unittest.TestCase):
+    def test_normalize_name(self):
+        self.assertEqual(normalize_name("  Acme  Oy (Helsinki). "), "acme oy helsinki")
+        self.assertEqual(normalize_name("Acme,\u00a0Inc."), "acme inc")
+        self.assertEqual(normalize_name(""), "")
+
+
+class SniffDelimiterTest(unittest.TestCase):
+    def sniff(self, header: str) -> str:
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as f:
+            f.write(header + "\n1;2,3|4\t5\n")
+        try:
+            return sniff_delimiter(f.name)
+        finally:
+            os.remove(f.name)
+
+    def test_most_frequent_candidate_wins(self):
+        self.assertEqual(self.sniff("id;name;domain"), ";")
+        self.assertEqual(self.sniff("id,name,domain"), ",")
+        self.assertEqual(self.sniff("id|name|domain"), "|")
+        self.assertEqual(self.sniff("id\tname\tdomain"), "\t")
+        # only the header line counts
+        self.assertEqual(self.sniff("id,name;domain,match_type"), ",")
+
+    def test_ties_and_single_column_default_to_semicolon(self):
+        self.assertEqual(self.sniff("id"), ";")
+        self.assertEqual(self.sniff("id,name;domain"), ";")
+
+
+class MakeGroupKeyTest(unittest.TestCase):
+    def test_match_type_columns(self):
+        key = make_group_key(["company_id", "name", "domain", "match_type"])
+        self.assertEqual(key({"match_type": "company_name", "name": "Acme, Oy"}), ("company_name", "acme oy"))
+        self.assertEqual(
+            key({"match_type": "contact_domain", "contact_domain": " Acme.FI "}),
+            ("contact_domain", "acme.fi"),
+        )
+        self.assertEqual(key({"match_type": "", "domain": "ACME.fi"}), ("company_domain", "acme.fi"))
+        self.assertEqual(key({"domain": "acme.fi"}), ("company_domain", "acme.fi"))
+        self.assertEqual(key({"match_type": "business_id", "name": "Acme Oy"}), ("business_id", "acme oy"))
+        # match_key / group_key are ignored when their columns are missing
+        self.assertEqual(
+            key({"match_type": "company_name", "name": "Acme", "match_key": "x", "group_key": "g"}),
+            ("company_name", "acme"),
+        )
+
+    def test_match_key_and_group_key(self):
+        key = make_group_key(["name", "domain", "match_type", "match_key", "group_key"])
+        self.assertEqual(key({"group_key": " G1 ", "match_key": "k"}), ("group", "g1"))
+        self.assertEqual(key({"match_type": "fuzzy", "match_key": "ABC"}), ("fuzzy", "abc"))
+        self.assertEqual(key({"match_key": "ABC"}), ("match", "abc"))
+        self.assertEqual(
+            key({"match_type": "company_name", "match_key": " ", "name": "Acme"}),
+            ("company_name", "acme"),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import time
+import unittest
+from unittest import mock
+
+from export_all_companies import Company, resolve_canonical_ids_bulk
+
+
+def companies(parents: dict) -> list:
+    return [Company(cid, "", "", "", parent) for cid, parent in parents.items()]
+
+
+class ResolveCanonicalIdsBulkTest(unittest.TestCase):
+    def resolve(self, parents: dict, **kwargs) -> dict:
+        return resolve_canonical_ids_bulk(None, companies(parents), **kwargs)
+
+    def test_chains_inside_the_export(self):
+        resolved = self.resolve({"1": "2", "2": "3", "3": "", "4": "4", "5": "3"})
+        self.assertEqual(resolved, {"1": "3", "2": "3", "3": "3", "4": "4", "5": "3"})
+
+    def test_max_depth_stops_the_walk(self):
+        parents = {"1": "2", "2": "3", "3": "4", "4": ""}
+        expected = {"1": "3", "2": "4", "3": "4", "4": "4"}
+        self.assertEqual(self.resolve(parents, max_depth=2), expected)
+
+    def test_path_compression_keeps_max_depth(self):
+        # "3" is resolved first; "1" must not take its shortcut past max_depth
+        parents = {"3": "4", "1": "2", "2": "3", "4": ""}
+        expected = {"3": "4", "1": "3", "2": "4", "4": "4"}
+        self.assertEqual(self.resolve(parents, max_depth=2), expected)
+        self.assertEqual(self.resolve(dict(reversed(parents.items())), max_depth=2), expected)
+
+    def test_cycle_resolves_like_a_plain_walk(self):
+        self.assertEqual(self.resolve({"1": "2", "2": "1"}), {"1": "1", "2": "2"})
+        self.assertEqual(self.resolve({"1": "2", "2": "1"}, max_depth=3), {"1": "2", "2": "1"})
+
+    def test_targets_outside_the_export_come_from_cache(self):
+        now = time.time()
+        cache = {"90": ("91", now), "91": ("", now), "92": (None, now)}
+        resolved = self.resolve({"1": "90", "2": "92", "3": ""}, cache=cache)
+        self.assertEqual(resolved, {"1": "91", "2": "92", "3": "3"})
+
+    def test_fetched_targets_are_cached(self):
+        cache = {}
+        with mock.patch(
+            "export_all_companies.fetch_canonical_parents", return_value={"90": ""}
+        ) as fetch:
+            resolved = self.resolve({"1": "90", "2": "90"}, cache=cache)
+        fetch.assert_called_once_with(None, ["90"])
+        self.assertEqual(resolved, {"1": "90", "2": "90"})
+        self.assertEqual(list(cache), ["90"])
+        self.assertEqual(cache["90"][0], "")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import os
+import tempfile
+import time
+import unittest
+
+import orjson
+
+from merge_by_name import CACHE_TTL, CanonicalCache, load_canonical_cache, save_canonical_cache
+
+
+class CanonicalCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "data", ".canonical_cache.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def read_file(self) -> dict:
+        with open(self.path, "rb") as f:
+            return orjson.loads(f.read())
+
+    def test_save_and_load_round_trip(self):
+        now = time.time()
+        save_canonical_cache(self.path, {"1": ("2", now), "2": ("", now), "3": (None, now)})
+        self.assertEqual(
+            load_canonical_cache(self.path), {"1": ("2", now), "2": ("", now), "3": (None, now)}
+        )
+        self.assertFalse(os.path.exists(self.path + ".tmp"))
+
+    def test_expired_entries_are_dropped(self):
+        now = time.time()
+        save_canonical_cache(
+            self.path, {"fresh": ("1", now - CACHE_TTL + 60), "stale": ("1", now - CACHE_TTL - 60)}
+        )
+        self.assertEqual(list(load_canonical_cache(self.path)), ["fresh"])
+
+    def test_missing_or_unreadable_file(self):
+        self.assertEqual(load_canonical_cache(self.path), {})
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, "w") as f:
+            f.write("{not json")
+        self.assertEqual(load_canonical_cache(self.path), {})
+
+    def test_store_and_invalidate(self):
+        now = time.time()
+        save_canonical_cache(self.path, {"1": ("2", now), "2": ("", now)})
+        cache = CanonicalCache(self.path)
+        cache.load()
+        self.assertIn("1", cache)
+        self.assertEqual(cache.get_properties("1"), {"hs_canonical_object_id": "2"})
+
+        cache.store("3", None)
+        cache.store("4", {"hs_canonical_object_id": " 5 "})
+        self.assertIsNone(cache.get_properties("3"))
+        self.assertEqual(cache.get_properties("4"), {"hs_canonical_object_id": "5"})
+
+        # a merged company points somewhere else now
+        cache.invalidate("1")
+        cache.invalidate("missing")
+        self.assertNotIn("1", cache)
+        cache.save()
+        self.assertEqual(sorted(self.read_file()), ["2", "3", "4"])
+
+    def test_save_only_when_changed(self):
+        cache = CanonicalCache(self.path)
+        cache.load()
+        cache.invalidate("1")
+        cache.save()
+        self.assertFalse(os.path.exists(self.path))
+
+
+if __name__ == "__main__":
+    unittest.main()